@@ -1,9 +1,10 @@
+import atexit
+import threading
 import tkinter as tk
 from ui.login_frame import LoginFrame
 from ui.cases_frame import CasesFrame
 from ui.viewer_frame import ViewerFrame
-from logic.backend import get_initial_cases
-from logic.mongo_db import MongoDB
+from logic.mongo_db import get_db
 
 
 class App(tk.Tk):
@@ -11,11 +12,15 @@ class App(tk.Tk):
         super().__init__()
         self.title("Lung Cancer Viewer - MVP")
         self.geometry("1100x650")
-        self._db = MongoDB()
+        # shared storage handle; connected (indexes, migrations) on a background
+        # thread so the Tk thread never waits on MongoDB at startup
+        self.db = get_db()
+        self.db_error = None
+        self._connect_in_background()
 
         # App state
         self.current_user_role = None
-        self.cases = get_initial_cases()
+        self.cases = []  # pages loaded by CasesFrame
         self.current_case = None
 
         # Main container that hosts all pages
@@ -37,9 +42,47 @@ class App(tk.Tk):
 
         # Start maximized so login fills the screen
         self.after(50, self._maximize)
+        # Cache eviction and blob compaction are indexed queries; run them once the window is up
+        self.after(2000, self._clean_cache_in_background)
 
-    def get_initial_cases(self):
-        return self._db.list_cases()
+        # Release decoded frames, spill files and the Mongo client on exit, whichever way it happens
+        self._released = False
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        atexit.register(self._release)
+
+    def _release(self):
+        if self._released:
+            return
+        self._released = True
+        for frame in self.frames.values():
+            if hasattr(frame, "shutdown"):
+                try:
+                    frame.shutdown()
+                except Exception as e:
+                    print(f"[App] Shutdown of {type(frame).__name__} failed: {e}")
+        self.db.close()
+
+    def _on_close(self):
+        self._release()
+        self.destroy()
+
+    def _connect_in_background(self):
+        def work():
+            try:
+                self.db.connect()
+            except Exception as e:
+                self.db_error = e
+                print(f"[App] Could not connect to MongoDB: {e}")
+        threading.Thread(target=work, name="mongo-connect", daemon=True).start()
+
+    def _clean_cache_in_background(self):
+        def work():
+            try:
+                self.db.clean_cache(max_age_seconds=7 * 24 * 60 * 60)
+                self.db.compact_blobs()
+            except Exception as e:
+                print(f"[App] Background cleanup failed: {e}")
+        threading.Thread(target=work, name="cache-cleanup", daemon=True).start()
 
     def _maximize(self):
         try:
@@ -59,5 +102,4 @@ class App(tk.Tk):
 
 if __name__ == "__main__":
     app = App()
-    app._db.clean_cache(max_age_seconds=7 * 24 * 60 * 60)
     app.mainloop()
@@ -0,0 +1,97 @@
+"""
+Latency / throughput of sklearn vs the NumPy MLP engine.
+
+    python -m benchmarks.bench_mlp [--models-dir DIR] [--json out.json]
+
+Uses the artifacts in `minimal_AI_model/models` when `mlp.joblib` exists,
+otherwise a randomly initialised MLP with the same 4096 -> 512 -> 256 -> 4
+shape, so the comparison also runs on machines without the trained model.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from logic.mlp_engine import NumpyMLP, fold_scaler, max_abs_diff
+from logic.model_session import MODELS_DIR
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+
+
+def load_or_synthesize_model(models_dir: Path):
+    if (models_dir / "mlp.joblib").exists():
+        import joblib
+        return joblib.load(str(models_dir / "mlp.joblib")), joblib.load(str(models_dir / "scaler.joblib"))
+
+    import warnings
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.default_rng(0)
+    x = rng.random((64, 64 * 64), dtype=np.float32)
+    y = np.arange(64) % 4
+    scaler = StandardScaler().fit(x)
+    model = MLPClassifier(hidden_layer_sizes=(512, 256), max_iter=1, random_state=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model.fit(scaler.transform(x), y)
+    return model, scaler
+
+
+def _time(fn, min_seconds: float) -> float:
+    fn()  # warm-up
+    n, t0 = 0, time.perf_counter()
+    while True:
+        fn()
+        n += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_seconds and n >= 3:
+            return elapsed / n
+
+
+def run(models_dir: Path, min_seconds: float = 0.2):
+    model, scaler = load_or_synthesize_model(models_dir)
+    arrays = fold_scaler(model, scaler)
+    n = int(arrays["n_layers"])
+    engine = NumpyMLP([arrays[f"W{i}"] for i in range(n)], [arrays[f"b{i}"] for i in range(n)],
+                      str(arrays["activation"]), str(arrays["out_activation"]))
+
+    rng = np.random.default_rng(1)
+    rows = []
+    for bs in BATCH_SIZES:
+        x = rng.random((bs, engine.n_features), dtype=np.float32)
+        t_sk = _time(lambda: model.predict_proba(scaler.transform(x)), min_seconds)
+        t_np = _time(lambda: engine.predict_proba(x), min_seconds)
+        rows.append({
+            "batch_size": bs,
+            "sklearn_ms": t_sk * 1000,
+            "numpy_ms": t_np * 1000,
+            "sklearn_per_s": bs / t_sk,
+            "numpy_per_s": bs / t_np,
+            "speedup": t_sk / t_np,
+            "max_abs_diff": max_abs_diff(model, scaler, engine, x),
+        })
+    return rows
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--models-dir", default=str(MODELS_DIR))
+    p.add_argument("--min-seconds", type=float, default=0.2, help="minimum timing window per measurement")
+    p.add_argument("--json", help="write results to this file")
+    args = p.parse_args()
+
+    rows = run(Path(args.models_dir), args.min_seconds)
+    print(f"{'batch':>6} {'sklearn ms':>11} {'numpy ms':>9} {'sklearn/s':>10} {'numpy/s':>10} {'speedup':>8} {'max diff':>9}")
+    for r in rows:
+        print(f"{r['batch_size']:>6} {r['sklearn_ms']:>11.3f} {r['numpy_ms']:>9.3f} {r['sklearn_per_s']:>10.0f} "
+              f"{r['numpy_per_s']:>10.0f} {r['speedup']:>7.2f}x {r['max_abs_diff']:>9.1e}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Stage-by-stage timings of the CT preprocessing and inference pipeline.
+
+    python -m benchmarks.bench_pipeline --json results.json
+    python -m benchmarks.bench_pipeline --json new.json --compare results.json
+
+Synthetic inputs are generated in a temp directory (8-bit and 16-bit PNG;
+512x512 16-bit DICOM as single frame, multi-frame, MONOCHROME1, with and
+without a VOI window), so the suite runs offline and needs no MongoDB.
+For every input the AI path is split into decode, resize, normalize, scale
+and predict; the end-to-end `predict_ct_section`, `dicom_to_gray_np` and the
+viewer's display decoding (`viewer_decode`: header probe, per-frame decode
+into a FrameStore; `viewer_decode_rgba`: the older whole-file RGBA decode)
+are timed as well. For the two viewer paths the growth of peak RSS is
+recorded too (`peak_rss_mb`, measured in a child process; Linux and macOS).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from benchmarks.bench_mlp import load_or_synthesize_model
+from logic.frame_provider import probe_file
+from logic.frame_store import FrameStore
+from logic.image_utils import (dicom_display_source, dicom_to_display_frames, dicom_to_gray_frames, dicom_to_gray_np,
+                               display_window, image_to_display_array)
+from logic.inference import predict_ct_section
+from logic.model_session import MODELS_DIR
+
+IMG_SIZE = 64
+
+
+def _ct_like(rng: np.random.Generator, n_frames: int, size: int = 512) -> np.ndarray:
+    """Body-shaped disc of soft tissue with noise, in CT-style 12-bit stored values."""
+    yy, xx = np.mgrid[:size, :size]
+    r = np.hypot(yy - size / 2, xx - size / 2)
+    base = np.where(r < size * 0.42, 1040.0, 24.0)
+    frames = base[None] + rng.normal(0, 40, (n_frames, size, size))
+    return np.clip(frames, 0, 4095).astype(np.uint16)
+
+
+def write_dicom(path: str, pixels: np.ndarray, monochrome1: bool = False, voi: bool = False) -> str:
+    from pydicom.dataset import FileDataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.2"  # CT Image Storage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = FileDataset(path, {}, file_meta=meta, preamble=b"\0" * 128)
+    ds.SOPClassUID = meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = "CT"
+    ds.Rows, ds.Columns = pixels.shape[-2:]
+    if pixels.ndim == 3:
+        ds.NumberOfFrames = pixels.shape[0]
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME1" if monochrome1 else "MONOCHROME2"
+    ds.BitsAllocated = 16
+    ds.BitsStored = 12
+    ds.HighBit = 11
+    ds.PixelRepresentation = 0
+    ds.RescaleIntercept = -1024
+    ds.RescaleSlope = 1
+    if voi:
+        ds.WindowCenter = 40
+        ds.WindowWidth = 400
+    ds.PixelData = pixels.astype("<u2").tobytes()
+    ds.save_as(path, enforce_file_format=True)
+    return path
+
+
+def make_inputs(out_dir: str, frames: int = 16) -> Dict[str, str]:
+    rng = np.random.default_rng(0)
+    single = _ct_like(rng, 1)[0]
+    inputs = {}
+
+    inputs["png_8bit"] = os.path.join(out_dir, "ct_8bit.png")
+    Image.fromarray((single >> 4).astype(np.uint8)).save(inputs["png_8bit"])
+    inputs["png_16bit"] = os.path.join(out_dir, "ct_16bit.png")
+    cv2.imwrite(inputs["png_16bit"], (single.astype(np.uint32) << 4).astype(np.uint16))
+
+    inputs["dcm_single"] = write_dicom(os.path.join(out_dir, "single.dcm"), single)
+    inputs["dcm_single_voi"] = write_dicom(os.path.join(out_dir, "single_voi.dcm"), single, voi=True)
+    inputs["dcm_mono1"] = write_dicom(os.path.join(out_dir, "mono1.dcm"), single, monochrome1=True)
+    inputs["dcm_multiframe"] = write_dicom(os.path.join(out_dir, "multi.dcm"), _ct_like(rng, frames))
+    inputs["dcm_multiframe_voi"] = write_dicom(os.path.join(out_dir, "multi_voi.dcm"), _ct_like(rng, frames), voi=True)
+    return inputs
+
+
+def _timeit(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    fn()  # warm-up (imports, page cache)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p90_ms": samples[min(len(samples) - 1, int(round(0.9 * (len(samples) - 1))))],
+        "mean_ms": statistics.fmean(samples),
+        "min_ms": samples[0],
+        "n": repeat,
+    }
+
+
+def _decode_gray(path: str) -> List[np.ndarray]:
+    if path.lower().endswith(".dcm"):
+        return dicom_to_gray_frames(path)
+    return [cv2.imread(path, cv2.IMREAD_GRAYSCALE)]
+
+
+def _viewer_decode(path: str, spill_dir: str) -> FrameStore:
+    """The viewer's load path without the threads: header probe, per-frame decode, compact store."""
+    f = probe_file(path)
+    store = FrameStore(spill_dir)
+    for j in range(f.frames):
+        window = None
+        if f.dicom:
+            frame = dicom_display_source(f.path, j, f.header)
+            if frame.ndim == 2:
+                window = display_window(frame)
+        else:
+            with Image.open(f.path) as img:
+                frame = image_to_display_array(img)
+        store.put(0, f.frames, j, frame, window)
+    return store
+
+
+# viewer load paths whose peak memory is measured (each in a fresh interpreter)
+RSS_STAGES: Dict[str, Callable[[str], Any]] = {
+    "viewer_decode": lambda path: _viewer_decode(path, os.path.join(os.path.dirname(path), "frames")),
+    "viewer_decode_rgba": lambda path: dicom_to_display_frames(path),
+}
+
+
+def _peak_rss_mb(stage: str, path: str) -> Optional[float]:
+    """
+    Growth of the peak resident set while `stage` loads `path`, in MB. Peak
+    RSS never goes down within a process, so every measurement runs in a
+    child interpreter. None where it cannot be read (Windows).
+    """
+    if _peak_rss_bytes() is None:
+        return None
+    root = Path(__file__).resolve().parent.parent
+    out = subprocess.run([sys.executable, "-m", "benchmarks.bench_pipeline", "--rss-stage", stage, path],
+                         cwd=str(root), capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    # Linux: VmHWM belongs to this process image; ru_maxrss would carry over the parent's peak across exec
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # bytes on macOS
+
+
+def _rss_child(stage: str, path: str) -> None:
+    before = _peak_rss_bytes()
+    result = RSS_STAGES[stage](path)
+    after = _peak_rss_bytes()
+    if isinstance(result, FrameStore):
+        result.close()
+    print(f"{(after - before) / 1024 ** 2:.2f}")
+
+
+def bench_input(name: str, path: str, model, scaler, repeat: int) -> Dict[str, Dict[str, float]]:
+    frames = _decode_gray(path)
+    resized = [cv2.resize(f, (IMG_SIZE, IMG_SIZE)) for f in frames]
+    x = np.stack([r.reshape(-1) for r in resized]).astype(np.float32) / 255.0
+    x_scaled = scaler.transform(x)
+
+    stages = {
+        "decode": lambda: _decode_gray(path),
+        "resize": lambda: [cv2.resize(f, (IMG_SIZE, IMG_SIZE)) for f in frames],
+        "normalize": lambda: np.stack([r.reshape(-1) for r in resized]).astype(np.float32) / 255.0,
+        "scale": lambda: scaler.transform(x),
+        "predict": lambda: model.predict_proba(x_scaled),
+    }
+    spill_dir = os.path.join(os.path.dirname(path), "frames")
+    stages["viewer_decode"] = lambda: _viewer_decode(path, spill_dir).close()
+    if path.lower().endswith(".dcm"):
+        stages["dicom_to_gray_np"] = lambda: dicom_to_gray_np(path)
+        stages["viewer_decode_rgba"] = lambda: dicom_to_display_frames(path)  # previous all-frames RGBA path
+    if len(frames) == 1:
+        stages["predict_ct_section"] = lambda: predict_ct_section(path, model, scaler, IMG_SIZE)
+
+    out = {stage: _timeit(fn, repeat) for stage, fn in stages.items()}
+    for timing in out.values():
+        timing["frames"] = len(frames)
+    for stage in RSS_STAGES:
+        if stage in out:
+            out[stage]["peak_rss_mb"] = _peak_rss_mb(stage, path)
+    print(f"  {name:<20} " + "  ".join(f"{k}={v['median_ms']:.2f}ms" for k, v in out.items()))
+    rss = {k: v["peak_rss_mb"] for k, v in out.items() if v.get("peak_rss_mb") is not None}
+    if rss:
+        print(f"  {'':<20} peak RSS " + "  ".join(f"{k}=+{v:.1f}MB" for k, v in rss.items()))
+    return out
+
+
+def run(repeat: int = 20, frames: int = 16, models_dir: str = str(MODELS_DIR)) -> Dict[str, Any]:
+    model, scaler = load_or_synthesize_model(Path(models_dir))
+    with tempfile.TemporaryDirectory(prefix="lct_bench_") as tmp:
+        inputs = make_inputs(tmp, frames=frames)
+        print(f"[bench_pipeline] {len(inputs)} synthetic inputs, {repeat} repeats each")
+        results = {name: bench_input(name, path, model, scaler, repeat) for name, path in inputs.items()}
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "frames": frames,
+        },
+        "results": results,
+    }
+
+
+def compare(new: Dict[str, Any], old: Dict[str, Any]) -> None:
+    """Print median ratios new/old; < 1.0 means faster."""
+    print(f"{'input':<20} {'stage':<20} {'old ms':>9} {'new ms':>9} {'ratio':>7}")
+    for name, stages in new["results"].items():
+        for stage, timing in stages.items():
+            prev = old.get("results", {}).get(name, {}).get(stage)
+            if not prev:
+                continue
+            ratio = timing["median_ms"] / prev["median_ms"] if prev["median_ms"] else float("nan")
+            print(f"{name:<20} {stage:<20} {prev['median_ms']:>9.3f} {timing['median_ms']:>9.3f} {ratio:>6.2f}x")
+
+    print(f"\n{'input':<20} {'stage':<20} {'old MB':>9} {'new MB':>9} {'ratio':>7}")
+    for name, stages in new["results"].items():
+        for stage, timing in stages.items():
+            prev = old.get("results", {}).get(name, {}).get(stage, {})
+            if timing.get("peak_rss_mb") is None or prev.get("peak_rss_mb") is None:
+                continue
+            ratio = timing["peak_rss_mb"] / prev["peak_rss_mb"] if prev["peak_rss_mb"] else float("nan")
+            print(f"{name:<20} {stage:<20} {prev['peak_rss_mb']:>9.1f} {timing['peak_rss_mb']:>9.1f} {ratio:>6.2f}x")
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--frames", type=int, default=16, help="frames in the multi-frame DICOM inputs")
+    p.add_argument("--models-dir", default=str(MODELS_DIR))
+    p.add_argument("--json", help="write results to this file")
+    p.add_argument("--compare", help="previous results file to compare against")
+    p.add_argument("--rss-stage", choices=sorted(RSS_STAGES), help=argparse.SUPPRESS)
+    p.add_argument("rss_path", nargs="?", help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.rss_stage:
+        _rss_child(args.rss_stage, args.rss_path)
+        return
+
+    report = run(args.repeat, args.frames, args.models_dir)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
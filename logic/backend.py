@@ -1,68 +1,202 @@
-from pathlib import Path
-from typing import Dict, Any, List
-from logic.image_utils import dicom_to_gray_np
-
-import cv2
-import joblib
-import numpy as np
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 
 from model.models import Case
-from logic.mongo_db import MongoDB
+from logic.downloads import FileProgress
+from logic.frame_provider import FrameProvider
+from logic.mongo_db import MongoDB, get_db, matches_query
+from logic.model_session import get_session
+from logic.result_cache import ResultCache
+from logic.inference import ProgressCallback, build_ai_result, predict_ct_series
+
+_results = ResultCache()
+
+# Every function below takes an optional `db`; by default they share the
+# process-wide handle from `get_db()`, which connects on first use.
+
+
+def get_initial_cases(db: Optional[MongoDB] = None) -> List[Case]:
+    return (db or get_db()).list_cases()
+
+
+def search_cases(query: str = "", sort: str = "case_id", descending: bool = False,
+                 page_size: int = 100, after: Optional[Dict[str, Any]] = None,
+                 db: Optional[MongoDB] = None) -> Tuple[List[Case], Optional[Dict[str, Any]]]:
+    """
+    One page of cases matching `query`; pass the returned cursor as `after` for the next page.
+    """
+    return (db or get_db()).search_cases(query, sort=sort, descending=descending, page_size=page_size, after=after)
+
+
+def case_matches(case: Case, query: str) -> bool:
+    """
+    Whether `search_cases(query)` would return this case.
+    """
+    return matches_query(case.case_id, case.patient_name, query)
+
+
+def case_changes(since: datetime, progress: Optional[ProgressCallback] = None,
+                 db: Optional[MongoDB] = None) -> Tuple[List[Case], List[str], datetime]:
+    """
+    (changed cases, deleted case_ids, new watermark) since the last sync.
+    """
+    return (db or get_db()).changes_since(since)
+
+
+def next_case_id(db: Optional[MongoDB] = None) -> str:
+    return f"LC-{(db or get_db()).next_case_number() + 1:03d}"
+
+
+def resolve_case_images(case: Case, progress: Optional[ProgressCallback] = None,
+                        db: Optional[MongoDB] = None) -> List[str]:
+    """
+    Local paths for a case's images, fetched from GridFS only now that they are needed.
+
+    Files download in parallel; `progress` receives the bytes done across the
+    whole case plus the name of the file that last advanced.
+    """
+    db = db or get_db()
+    if progress is None:
+        return db.resolve_images(case.ct_images)
+    on_file = _byte_progress(progress, "Downloading", dict(zip(case.ct_images, case.image_names)),
+                             dict(zip(case.ct_images, case.image_sizes)))
+    return db.resolve_images(case.ct_images, progress=on_file)
+
+
+def open_case_frames(case: Case, progress: Optional[ProgressCallback] = None,
+                     db: Optional[MongoDB] = None) -> FrameProvider:
+    """
+    Fetch a case's images and read their headers for the viewer; pixels are
+    decoded later, frame by frame, as the viewer asks for them.
+    """
+    db = db or get_db()
+    paths = resolve_case_images(case, progress, db)
+    return FrameProvider.open(paths, db.pyramids, spill_dir=os.path.join(db.cache_dir, "frames"))
+
+
+def _byte_progress(progress: ProgressCallback, verb: str, names: Dict[str, str],
+                   sizes: Dict[str, int]) -> FileProgress:
+    """
+    Fold per-file byte progress from parallel transfers into one overall callback.
+    """
+    per_file: Dict[str, Tuple[int, int]] = {ref: (0, size) for ref, size in sizes.items()}
+    lock = threading.Lock()
+
+    def on_file(ref: str, done: int, total: int) -> None:
+        with lock:
+            per_file[ref] = (done, total)
+            done_all = sum(d for d, _ in per_file.values())
+            total_all = sum(t for _, t in per_file.values())
+        progress(done_all, total_all,
+                 f"{verb} {names.get(ref, ref)} ({done_all / 1e6:.1f}/{total_all / 1e6:.1f} MB)")
+
+    return on_file
+
+
+def run_ai(case: Case, progress: Optional[ProgressCallback] = None,
+           db: Optional[MongoDB] = None) -> Dict[str, Any]:
+    """
+    Score a case, reusing a stored result when neither the images nor the model changed.
+
+    Lookup order is the in-process cache, then `ai_result` in MongoDB, then
+    the model itself; fresh results are written back to both.
+    """
+    db = db or get_db()
+    total = len(case.ct_images) + 1
+    if progress:
+        progress(0, total, "Fetching images")
+    paths = resolve_case_images(case, db=db)
+    if progress:
+        progress(0, total, "Loading model")
+    session = get_session().ensure_loaded()
+
+    if progress:
+        progress(0, total, "Checking cached result")
+    input_hash = _results.input_hash(paths, db.image_cache.digest_for)
+    cached = _results.get(case.case_id, input_hash, session.fingerprint)
+    if cached is not None:
+        _results.record("hit")
+        _log_cache(case, "cache hit")
+        return dict(cached, cached=True)
+
+    db_result = db.get_ai_result(case.case_id)
+    if (db_result.get("input_hash") == input_hash
+            and db_result.get("model_fingerprint") == session.fingerprint
+            and db_result.get("biomarkers")):
+        _results.record("db_hit")
+        result = _result_from_db(db_result)
+        _results.put(case.case_id, input_hash, session.fingerprint, result)
+        _log_cache(case, "stored result")
+        return dict(result, cached=True)
+
+    _results.record("miss")
+    series = predict_ct_series(paths, session.model, session.scaler,
+                               class_names=session.class_names, progress=progress)
+    ai_doc = build_ai_result(series, session, input_hash)
+    result = {
+        "biomarkers": ai_doc["biomarkers"],
+        "explanation": ai_doc["explanation"],
+        "heatmap": db_result.get("heatmap"),
+        "slices": ai_doc["slices"],  # same shape as a stored result (no local paths)
+        "aggregate": ai_doc["aggregate"],
+        "model_version": session.version,
+    }
 
-_db = MongoDB()
+    db.save_ai_result(case.case_id, ai_doc)
+    _results.put(case.case_id, input_hash, session.fingerprint, result)
+    _log_cache(case, "scored")
+    return dict(result, cached=False)
 
 
-def get_initial_cases() -> List[Case]:
-    return _db.list_cases()
+def ai_cache_stats() -> Dict[str, int]:
+    return _results.stats()
 
 
-def run_ai(case: Case) -> Dict[str, Any]:
-    db_result = _db.get_ai_result(case.case_id)
-    model = joblib.load(str(Path(__file__).resolve().parent.parent / "minimal_AI_model" / "models" / "mlp.joblib"))
-    scaler = joblib.load(str(Path(__file__).resolve().parent.parent / "minimal_AI_model" / "models" / "scaler.joblib"))
-    class_names = np.load(
-        str(Path(__file__).resolve().parent.parent / "minimal_AI_model" / "models" / "class_names.npy"),
-        allow_pickle=True
-    ).tolist()
+def _log_cache(case: Case, outcome: str) -> None:
+    s = ai_cache_stats()
+    print(f"[AI] {case.case_id}: {outcome} (cache hits {s['hits']}, stored {s['db_hits']}, "
+          f"misses {s['misses']}, {s['entries']} cached)")
 
-    pred_class, probs = predict_ct_section(case.ct_images[0], model, scaler, class_names=class_names)
 
+def _result_from_db(db_result: Dict[str, Any]) -> Dict[str, Any]:
     return {
-        "biomarkers": [
-            {"name": "TTF-1", "value": probs[0]},
-            {"name": "CK7", "value": probs[1]},
-        ],
-        "explanation": f"The model predicts the CT section belongs to class {"TTF-1" if probs[0] > probs[1] else "CK7"} with probability {max(probs[0], probs[1])}.",
-        "heatmap": db_result.get("heatmap")
+        "biomarkers": db_result["biomarkers"],
+        "explanation": db_result["explanation"],
+        "heatmap": db_result.get("heatmap"),
+        "slices": db_result.get("slices", []),
+        "aggregate": db_result.get("aggregate", {}),
+        "model_version": db_result.get("model_version"),
     }
 
 
-def add_case(case: Case) -> str:
-    return _db.insert_case(case)
-
-
-def update_case(case: Case) -> bool:
-    return _db.update_case(case)
-
-
-def delete_case(case_id: str) -> bool:
-    return _db.delete_case(case_id)
-
-
-def predict_ct_section(img_path, model, scaler, img_size=64, class_names=None):
-    if img_path.lower().endswith(".dcm"):
-        img = dicom_to_gray_np(img_path)
-    else:
-        img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        raise ValueError(f"Could not read image: {img_path}")
-
-    img = cv2.resize(img, (img_size, img_size))
-    img = img.astype(np.float32) / 255.0
-    x = img.flatten().reshape(1, -1)
-
-    x_scaled = scaler.transform(x)
-    probs = model.predict_proba(x_scaled)[0]
-    pred_idx = np.argmax(probs)
-    pred_class = class_names[pred_idx] if class_names else pred_idx
-    return pred_class, probs
\ No newline at end of file
+def add_case(case: Case, progress: Optional[ProgressCallback] = None,
+             db: Optional[MongoDB] = None) -> Optional[Case]:
+    """
+    Store a new case, uploading its local images; slow for large series, so
+    the UI runs it on a worker thread and polls `progress`.
+    """
+    db = db or get_db()
+    if progress is None:
+        return db.insert_case(case)
+    names = {ref: os.path.basename(ref) for ref in case.ct_images}
+    return db.insert_case(case, progress=_byte_progress(progress, "Uploading", names, {}))
+
+
+def update_case(case: Case, progress: Optional[ProgressCallback] = None,
+                db: Optional[MongoDB] = None) -> Case:
+    """
+    Store edits to an existing case, uploading newly added images; runs on a
+    worker thread like `add_case`. Raises KeyError if the case is gone.
+    """
+    db = db or get_db()
+    if progress is None:
+        return db.update_case(case)
+    names = {ref: os.path.basename(ref) for ref in case.ct_images}
+    return db.update_case(case, progress=_byte_progress(progress, "Uploading", names, {}))
+
+
+def delete_case(case_id: str, progress: Optional[ProgressCallback] = None,
+                db: Optional[MongoDB] = None) -> bool:
+    return (db or get_db()).delete_case(case_id)
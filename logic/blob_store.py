@@ -0,0 +1,250 @@
+"""
+Reference-counted, content-addressed image storage on top of GridFS.
+
+Every GridFS image has one document in the `blobs` collection:
+
+    {_id: <GridFS ObjectId>, sha256, length, refcount, created_at}
+
+`refcount` is the number of entries across all cases' `ct_images` that
+point at the file, so a scan attached to several cases is stored once.
+Other GridFS files (an `ai_result.heatmap`, say) are not blobs: they get
+no document unless a case lists them in `ct_images`, and compaction never
+deletes a file that a case still points at through either field.
+Writers take their references before they save a case (an atomic $inc,
+so a blob cannot be reclaimed between lookup and use) and drop them after
+they remove one; deleting a case therefore never deletes a file another
+case still uses. Blobs whose count reaches zero are reclaimed by `compact`:
+
+    python -m logic.blob_store compact
+    python -m logic.blob_store recount     # repair counts from the cases collection
+"""
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+# the background compaction leaves young blobs alone, so a count that a
+# `recount` repair computed moments ago is not acted on mid-upload
+COMPACT_GRACE_SECONDS = 600
+
+
+def _oid(ref: str) -> Optional[ObjectId]:
+    return ObjectId(ref) if ObjectId.is_valid(ref) else None
+
+
+class BlobStore:
+    def __init__(self, blobs, fs, files, cases):
+        self.blobs = blobs  # the `blobs` collection
+        self.fs = fs  # GridFS handle
+        self.files = files  # its `fs.files` collection
+        self.cases = cases
+
+    def ensure_indexes(self) -> None:
+        self.blobs.create_indexes([
+            IndexModel([("sha256", ASCENDING)], name="sha256_unique", unique=True,
+                       partialFilterExpression={"sha256": {"$type": "string"}}),
+            IndexModel([("refcount", ASCENDING), ("created_at", ASCENDING)], name="refcount_created"),
+        ])
+        if self.blobs.estimated_document_count() == 0 and self.files.estimated_document_count() > 0:
+            self.recount()  # first run against files stored before the blob store existed
+
+    # -------------------------------------------------------------------------
+    # Lookup / registration
+    # -------------------------------------------------------------------------
+
+    def acquire(self, sha256: str, count: int = 1) -> Optional[str]:
+        """
+        Take `count` references on the blob with this digest; returns its ref,
+        or None if no such blob is stored (the caller uploads it).
+        """
+        blob = self.blobs.find_one_and_update({"sha256": sha256}, {"$inc": {"refcount": count}},
+                                              projection={"_id": 1})
+        return str(blob["_id"]) if blob else None
+
+    def register(self, file_id: ObjectId, sha256: str, length: int, count: int = 1) -> str:
+        """
+        Record a freshly uploaded GridFS file holding `count` references.
+
+        If another writer stored the same content first, the duplicate file
+        is deleted and references are taken on the existing blob instead.
+        """
+        try:
+            self.blobs.insert_one({
+                "_id": file_id, "sha256": sha256, "length": int(length),
+                "refcount": count, "created_at": datetime.now(timezone.utc),
+            })
+            return str(file_id)
+        except DuplicateKeyError:
+            ref = self.acquire(sha256, count)
+            if ref is None:
+                raise
+            self.fs.delete(file_id)
+            return ref
+
+    # -------------------------------------------------------------------------
+    # Reference counting
+    # -------------------------------------------------------------------------
+
+    def add_refs(self, refs: Iterable[str]) -> None:
+        self._inc(refs, +1)
+
+    def remove_refs(self, refs: Iterable[str]) -> None:
+        self._inc(refs, -1)
+
+    def _inc(self, refs: Iterable[str], sign: int) -> None:
+        # one update per distinct count, so a whole series is usually one round trip
+        counts = Counter(oid for oid in map(_oid, refs) if oid is not None)
+        by_count: Dict[int, List[ObjectId]] = {}
+        for oid, n in counts.items():
+            by_count.setdefault(n, []).append(oid)
+        for n, oids in by_count.items():
+            self.blobs.update_many({"_id": {"$in": oids}}, {"$inc": {"refcount": sign * n}})
+
+    # -------------------------------------------------------------------------
+    # Maintenance
+    # -------------------------------------------------------------------------
+
+    def compact(self, only: Optional[Iterable[str]] = None,
+                grace_seconds: float = COMPACT_GRACE_SECONDS) -> Tuple[int, int]:
+        """
+        Delete blobs nobody references and their GridFS files.
+
+        `only` limits the pass to the given refs. Each blob document is
+        removed with a conditional delete before its file, so a writer that
+        takes a new reference concurrently either keeps the blob or finds it
+        gone and uploads again. Returns (files deleted, bytes freed).
+        """
+        query: Dict[str, Any] = {
+            "refcount": {"$lte": 0},
+            "created_at": {"$lt": datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)},
+        }
+        if only is not None:
+            query["_id"] = {"$in": [oid for oid in map(_oid, only) if oid is not None]}
+
+        candidates = [blob["_id"] for blob in self.blobs.find(query, {"_id": 1})]
+        still_used = self._referenced(candidates)
+        if still_used:
+            # a count that missed a reference; deleting would break that case
+            print(f"[BlobStore] Kept {len(still_used)} zero-count blob(s) a case still references; run recount")
+
+        count = freed = 0
+        for oid in candidates:
+            if oid in still_used:
+                continue
+            gone = self.blobs.find_one_and_delete(dict(query, _id=oid))
+            if gone is None:
+                continue  # re-referenced meanwhile
+            try:
+                self.fs.delete(gone["_id"])
+            except Exception:
+                pass
+            count += 1
+            freed += int(gone.get("length", 0))
+        return count, freed
+
+    def _referenced(self, oids: List[ObjectId]) -> Set[ObjectId]:
+        """
+        The subset of `oids` that some case points at (`ct_images` or `ai_result.heatmap`).
+        """
+        if not oids:
+            return set()
+        by_ref = {str(oid): oid for oid in oids}
+        refs = list(by_ref) + list(oids)  # refs are stored as strings, older documents may hold ObjectIds
+        used = set()
+        for doc in self.cases.find({"$or": [{"ct_images": {"$in": refs}}, {"ai_result.heatmap": {"$in": refs}}]},
+                                   {"ct_images": 1, "ai_result.heatmap": 1}):
+            heatmap = (doc.get("ai_result") or {}).get("heatmap")
+            for ref in list(doc.get("ct_images") or []) + [heatmap]:
+                if ref is not None and str(ref) in by_ref:
+                    used.add(by_ref[str(ref)])
+        return used
+
+    def recount(self) -> Dict[str, int]:
+        """
+        Recompute every refcount from the cases collection, and create blob
+        documents for referenced GridFS files that have none (files stored
+        before the blob store existed; their digest is taken from metadata
+        when known). Files no case references and no blob document covers
+        belong to someone else and are left alone.
+        """
+        actual = Counter()
+        for row in self.cases.aggregate([
+            {"$unwind": "$ct_images"},
+            {"$group": {"_id": "$ct_images", "n": {"$sum": 1}}},
+        ]):
+            actual[str(row["_id"])] += row["n"]
+        # a heatmap is not a blob, but one that got a document anyway must never count as unused
+        for row in self.cases.aggregate([
+            {"$match": {"ai_result.heatmap": {"$nin": [None, ""]}}},
+            {"$group": {"_id": "$ai_result.heatmap", "n": {"$sum": 1}}},
+        ]):
+            actual[str(row["_id"])] += row["n"]
+
+        known = {str(b["_id"]): b.get("refcount", 0) for b in self.blobs.find({}, {"refcount": 1})}
+        created = fixed = 0
+        now = datetime.now(timezone.utc)
+        for f in self.files.find({}, {"length": 1, "metadata.sha256": 1, "uploadDate": 1}):
+            ref = str(f["_id"])
+            n = actual.get(ref, 0)
+            if ref not in known:
+                if n == 0:
+                    continue
+                doc = {"_id": f["_id"], "length": int(f.get("length", 0)), "refcount": n,
+                       "created_at": f.get("uploadDate") or now}
+                sha = (f.get("metadata") or {}).get("sha256")
+                if sha:
+                    doc["sha256"] = sha
+                try:
+                    self.blobs.insert_one(doc)
+                except DuplicateKeyError:
+                    doc.pop("sha256", None)  # same content uploaded twice; keep both, dedupe via the first
+                    self.blobs.insert_one(doc)
+                created += 1
+            elif known[ref] != n:
+                self.blobs.update_one({"_id": f["_id"]}, {"$set": {"refcount": n}})
+                fixed += 1
+        print(f"[BlobStore] Recounted references: {created} blob(s) added, {fixed} count(s) fixed")
+        return {"created": created, "fixed": fixed}
+
+    def stats(self) -> Dict[str, int]:
+        rows = list(self.blobs.aggregate([{"$group": {
+            "_id": None,
+            "blobs": {"$sum": 1},
+            "bytes": {"$sum": "$length"},
+            "references": {"$sum": "$refcount"},
+            "logical_bytes": {"$sum": {"$multiply": ["$length", {"$max": ["$refcount", 0]}]}},
+        }}]))
+        out = {"blobs": 0, "bytes": 0, "references": 0, "logical_bytes": 0}
+        if rows:
+            out.update({k: int(v) for k, v in rows[0].items() if k != "_id"})
+        return out
+
+
+def main(argv=None) -> None:
+    from logic.mongo_db import get_db
+
+    p = argparse.ArgumentParser(description="Maintain the reference-counted GridFS image store.")
+    p.add_argument("command", choices=["compact", "recount", "stats"])
+    p.add_argument("--grace", type=float, default=COMPACT_GRACE_SECONDS,
+                   help="seconds a new, unreferenced blob is kept (compact)")
+    args = p.parse_args(argv)
+
+    store = get_db().blobs
+    if args.command == "compact":
+        count, freed = store.compact(grace_seconds=args.grace)
+        print(f"[BlobStore] Reclaimed {count} blob(s), {freed / 1e6:.1f} MB")
+    elif args.command == "recount":
+        store.recount()
+    else:
+        s = store.stats()
+        saved = s["logical_bytes"] - s["bytes"]
+        print(f"[BlobStore] {s['blobs']} blob(s), {s['bytes'] / 1e6:.1f} MB stored for "
+              f"{s['references']} reference(s); dedup saves {saved / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
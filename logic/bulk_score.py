@@ -0,0 +1,147 @@
+"""
+Headless bulk scoring of every case in the MongoDB collection.
+
+    python -m logic.bulk_score --workers 8 --status Unsegmented --date-from 2025-01-01
+
+Cases are streamed from `MongoDB.cases`, scored by a pool of worker
+processes (each with its own MongoClient and warm ModelSession, downloading
+its own GridFS images) and written back with unordered bulk writes.
+
+Results stored in `ai_result` carry the model fingerprint, so an interrupted
+run resumes simply by running the same command again: cases already scored
+by the current model are skipped unless `--rescore` is given.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from pymongo import UpdateOne
+
+from logic.inference import build_ai_result, predict_ct_series
+from logic.model_session import get_session
+from logic.mongo_db import MongoDB, get_db
+from logic.result_cache import ResultCache
+
+_worker_db: Optional[MongoDB] = None
+_worker_hashes: Optional[ResultCache] = None
+
+
+def build_query(args: argparse.Namespace, fingerprint: str) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"ct_images.0": {"$exists": True}}
+    date_range = {}
+    if args.date_from:
+        date_range["$gte"] = args.date_from
+    if args.date_to:
+        date_range["$lte"] = args.date_to
+    if date_range:
+        query["date"] = date_range  # dates are stored as YYYY-MM-DD strings
+    if args.status:
+        query["segmentation_status"] = {"$in": args.status}
+    if args.only_unscored:
+        query["ai_result.biomarkers.0"] = {"$exists": False}
+    elif not args.rescore:
+        query["ai_result.model_fingerprint"] = {"$ne": fingerprint}
+    return query
+
+
+def iter_cases(db: MongoDB, query: Dict[str, Any], limit: int = 0) -> Iterator[Dict[str, Any]]:
+    cursor = db.cases.find(query, {"case_id": 1, "ct_images": 1}).sort("_id", 1).batch_size(200)
+    if limit:
+        cursor = cursor.limit(limit)
+    for doc in cursor:
+        yield {"_id": doc["_id"], "case_id": doc.get("case_id"), "ct_images": doc.get("ct_images", [])}
+
+
+def _init_worker() -> None:
+    global _worker_db, _worker_hashes
+    _worker_db = get_db()  # one client per worker process
+    _worker_hashes = ResultCache(max_entries=0)
+    get_session().ensure_loaded()
+
+
+def _score_case(doc: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        paths = _worker_db.resolve_images(doc["ct_images"])
+        session = get_session().ensure_loaded()
+        input_hash = _worker_hashes.input_hash(paths)
+        series = predict_ct_series(paths, session.model, session.scaler, class_names=session.class_names)
+        return {
+            "_id": doc["_id"],
+            "case_id": doc["case_id"],
+            "ai_result": build_ai_result(series, session, input_hash),
+            "n_images": len(paths),
+            "n_slices": len(series["slices"]),
+        }
+    except Exception as e:
+        return {"_id": doc["_id"], "case_id": doc["case_id"], "error": f"{type(e).__name__}: {e}"}
+
+
+def _flush(db: MongoDB, ops: List[UpdateOne]) -> None:
+    if ops:
+        db.cases.bulk_write(ops, ordered=False)
+        ops.clear()
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    db = get_db()
+    session = get_session().ensure_loaded()
+    query = build_query(args, session.fingerprint)
+    total = db.cases.count_documents(query)
+    print(f"[bulk_score] model {session.version}: {total} case(s) to score with {args.workers} worker(s)")
+
+    stats = {"cases": 0, "images": 0, "slices": 0, "errors": 0}
+    ops: List[UpdateOne] = []
+    t0 = last_report = time.perf_counter()
+
+    ctx = mp.get_context("spawn")  # pymongo clients are not fork-safe
+    with ctx.Pool(processes=args.workers, initializer=_init_worker) as pool:
+        try:
+            for res in pool.imap_unordered(_score_case, iter_cases(db, query, args.limit), chunksize=1):
+                if "error" in res:
+                    stats["errors"] += 1
+                    print(f"[bulk_score] {res['case_id']}: {res['error']}")
+                    continue
+                fields = {f"ai_result.{k}": v for k, v in res["ai_result"].items()}
+                ops.append(UpdateOne({"_id": res["_id"]}, {"$set": fields}))
+                stats["cases"] += 1
+                stats["images"] += res["n_images"]
+                stats["slices"] += res["n_slices"]
+                if len(ops) >= args.batch_size:
+                    _flush(db, ops)
+
+                now = time.perf_counter()
+                if now - last_report >= args.report_every:
+                    last_report = now
+                    elapsed = now - t0
+                    print(f"[bulk_score] {stats['cases']}/{total} cases, "
+                          f"{stats['images'] / elapsed:.1f} images/s, {stats['slices'] / elapsed:.1f} slices/s")
+        finally:
+            _flush(db, ops)  # keep finished work on Ctrl-C so a rerun resumes after it
+
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    stats["seconds"] = elapsed
+    stats["images_per_second"] = stats["images"] / elapsed
+    stats["slices_per_second"] = stats["slices"] / elapsed
+    print(f"[bulk_score] done: {stats['cases']} cases, {stats['images']} images, {stats['slices']} slices, "
+          f"{stats['errors']} errors in {elapsed:.1f}s ({stats['images_per_second']:.1f} images/s)")
+    return stats
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Score every case in MongoDB with the current model.")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    p.add_argument("--date-from", help="only cases with date >= YYYY-MM-DD")
+    p.add_argument("--date-to", help="only cases with date <= YYYY-MM-DD")
+    p.add_argument("--status", action="append", help="segmentation status to include (repeatable)")
+    p.add_argument("--only-unscored", action="store_true", help="skip cases that have any AI result")
+    p.add_argument("--rescore", action="store_true", help="also rescore cases already scored by this model")
+    p.add_argument("--limit", type=int, default=0, help="stop after this many cases")
+    p.add_argument("--batch-size", type=int, default=50, help="results per bulk write")
+    p.add_argument("--report-every", type=float, default=10.0, help="seconds between throughput reports")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
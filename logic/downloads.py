@@ -0,0 +1,84 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# progress(ref, bytes_done, bytes_total), called from worker threads
+FileProgress = Callable[[str, int, int], None]
+
+
+def stream_to_file(grid_out, local_path: str, ref: str = "", progress: Optional[FileProgress] = None,
+                   hasher=None) -> str:
+    """
+    Copy a GridOut to `local_path` chunk by chunk (feeding `hasher` on the way, if given).
+
+    Chunks go to a temp file in the target directory which is renamed into
+    place only when complete, so a crash or a concurrent reader never sees a
+    truncated image and memory use is bounded by the GridFS chunk size.
+    """
+    total = int(getattr(grid_out, "length", 0) or 0)
+    target_dir = os.path.dirname(local_path) or "."
+    fd, tmp = tempfile.mkstemp(dir=target_dir, prefix=".part-")
+    done = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if progress:
+                progress(ref, 0, total)
+            while True:
+                chunk = grid_out.readchunk()
+                if not chunk:
+                    break
+                f.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                done += len(chunk)
+                if progress:
+                    progress(ref, done, total)
+        os.replace(tmp, local_path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return local_path
+
+
+class DownloadManager:
+    """
+    Bounded thread pool that materializes several GridFS refs in parallel.
+
+    `resolve` is any callable mapping (ref, progress) -> local path, normally
+    `MongoDB._resolve_image_to_local_path`; results keep the order of the refs.
+    If any file fails (including a progress callback raising to cancel), the
+    files not yet started are dropped and the first error is re-raised.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gridfs-download")
+        self._inflight: Dict[str, threading.Lock] = {}
+        self._inflight_lock = threading.Lock()
+
+    def fetch_all(self, refs: List[str], resolve: Callable[[str, Optional[FileProgress]], str],
+                  progress: Optional[FileProgress] = None) -> List[str]:
+        if len(refs) <= 1:
+            return [self._one(ref, resolve, progress) for ref in refs]
+        futures = [self._pool.submit(self._one, ref, resolve, progress) for ref in refs]
+        try:
+            return [f.result() for f in futures]
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+    def _one(self, ref: str, resolve, progress: Optional[FileProgress]) -> str:
+        # one download per ref at a time; a second caller waits and then hits the cache
+        with self._inflight_lock:
+            lock = self._inflight.setdefault(ref, threading.Lock())
+        with lock:
+            return resolve(ref, progress)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
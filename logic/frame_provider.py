@@ -0,0 +1,205 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+from logic.frame_store import FRAME_BUDGET_BYTES, FrameStore
+from logic.image_utils import (apply_window, dicom_display_source, dicom_frame_count, display_window,
+                               image_to_display_array, is_dicom, read_dicom_header)
+from logic.pyramid import PyramidCache, build_levels
+
+
+@dataclass
+class SeriesFile:
+    path: str
+    frames: int = 0
+    rows: int = 0
+    cols: int = 0
+    dicom: bool = False
+    header: Any = None  # pydicom header (no pixel data) for DICOM files
+    error: Optional[str] = None
+
+
+def probe_file(path: str) -> SeriesFile:
+    """
+    Frame count and frame size of a PNG/JPG or DICOM file, read from its
+    header only; failures are recorded on the result rather than raised.
+    """
+    try:
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in (".png", ".jpg", ".jpeg") and is_dicom(path):
+            ds = read_dicom_header(path)
+            return SeriesFile(path, dicom_frame_count(ds), int(ds.Rows), int(ds.Columns), True, ds)
+        with Image.open(path) as img:  # lazy: reads the header, not the pixels
+            return SeriesFile(path, 1, img.height, img.width)
+    except Exception as e:
+        return SeriesFile(path, error=str(e))
+
+
+class FrameProvider:
+    """
+    Display frames of a case, decoded on demand.
+
+    The layout (frame count and size per file) is known from the headers as
+    soon as the provider is built; `request` queues decoding of the frames the
+    viewer is about to draw on a background thread, `get` returns a frame
+    once it is ready (or None), and `take_ready` tells the Tk side which
+    frames arrived since it last looked.
+
+    Decoded frames live in a FrameStore (compact, budgeted, spilling to
+    `spill_dir`) and are windowed to 8-bit only when asked for. Zoomed-out
+    views come from pyramid levels: the cached ones when the file was viewed
+    before (memory-mapped, no decoding), otherwise levels built per frame as
+    it is decoded and saved once the whole file has been seen.
+    """
+
+    def __init__(self, files: List[SeriesFile], pyramids: Optional[PyramidCache] = None,
+                 spill_dir: Optional[str] = None, budget_bytes: int = FRAME_BUDGET_BYTES, workers: int = 2):
+        self.files = files
+        self.pyramids = pyramids
+        self.store = FrameStore(spill_dir or os.path.join(tempfile.gettempdir(), "lct-frames"), budget_bytes)
+        self.first_index: List[int] = []
+        self._where: List[Tuple[int, int]] = []  # frame -> (file, frame within file)
+        for k, f in enumerate(files):
+            self.first_index.append(len(self._where))
+            self._where.extend((k, j) for j in range(f.frames))
+
+        self._stored: Dict[int, Dict[int, np.ndarray]] = {}
+        if pyramids is not None:
+            for k, f in enumerate(files):
+                if f.error is None:
+                    levels = pyramids.load(f.path)
+                    if levels is not None:
+                        self._stored[k] = levels
+
+        self.errors: Dict[int, str] = {}
+        self._wanted: Set[int] = set()
+        self._queued: Set[int] = set()
+        self._ready: Set[int] = set()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame-decode")
+
+    @classmethod
+    def open(cls, paths: Iterable[str], pyramids: Optional[PyramidCache] = None,
+             spill_dir: Optional[str] = None) -> "FrameProvider":
+        return cls([probe_file(p) for p in paths], pyramids, spill_dir)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def shape(self, i: int) -> Tuple[int, int]:
+        """
+        (rows, cols) of frame i.
+        """
+        f = self.files[self._where[i][0]]
+        return f.rows, f.cols
+
+    def get(self, i: int, factor: int = 1) -> Optional[np.ndarray]:
+        """
+        Frame i (uint8 gray or RGB) downsampled by `factor`, or None if not decoded yet.
+        """
+        k, j = self._where[i]
+        if factor > 1 and k in self._stored:
+            return np.asarray(self._stored[k][factor][j])
+        if factor > 1:
+            stored = self.store.get((k, factor), j)
+            return None if stored is None else np.asarray(stored[0])
+        stored = self.store.get(k, j)
+        if stored is None:
+            return None
+        frame, window = stored
+        return np.asarray(frame) if window is None else apply_window(frame, *window)
+
+    def request(self, indices: Iterable[int], factor: int = 1) -> None:
+        """
+        Decode these frames next; frames queued earlier and no longer wanted are skipped.
+        """
+        with self._lock:
+            self._wanted = set(indices)
+            for i in sorted(self._wanted):
+                if i in self._queued or i in self.errors or self.store.has(*self._where[i]):
+                    continue
+                if factor > 1 and self._where[i][0] in self._stored:
+                    continue
+                self._queued.add(i)
+                self._pool.submit(self._decode, i)
+
+    def pending(self) -> bool:
+        with self._lock:
+            return bool(self._queued or self._ready)
+
+    def take_ready(self) -> Set[int]:
+        with self._lock:
+            ready, self._ready = self._ready, set()
+            return ready
+
+    def close(self, wait: bool = False) -> None:
+        """
+        Stop decoding and delete the spilled frames. Queued frames are dropped;
+        the store is closed only after the frame being decoded has finished, on
+        a helper thread unless `wait` is set (e.g. at exit).
+        """
+        with self._lock:
+            self._closed = True
+            self._wanted = set()
+            self._stored = {}  # drop the pyramid memory maps
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if wait:
+            self._finish_close()
+        else:
+            threading.Thread(target=self._finish_close, name="frame-close").start()
+
+    def _finish_close(self) -> None:
+        self._pool.shutdown(wait=True)
+        self.store.close()
+
+    def _decode(self, i: int) -> None:
+        with self._lock:
+            if i not in self._wanted:
+                self._queued.discard(i)
+                return
+        k, j = self._where[i]
+        f = self.files[k]
+        error = None
+        try:
+            window = None
+            if f.dicom:
+                frame = dicom_display_source(f.path, j, f.header)
+                if frame.ndim == 2:
+                    window = display_window(frame)
+            else:
+                with Image.open(f.path) as img:
+                    frame = image_to_display_array(img)
+            if frame.shape[:2] != (f.rows, f.cols):
+                raise RuntimeError(f"Frame {j} is {frame.shape[1]}x{frame.shape[0]}, header says {f.cols}x{f.rows}")
+            self.store.put(k, f.frames, j, frame, window)
+            display = frame if window is None else apply_window(frame, *window)
+            for level, stack in build_levels([display]).items():
+                self.store.put((k, level), f.frames, j, stack[0])
+        except Exception as e:
+            error = str(e)
+        with self._lock:
+            self._queued.discard(i)
+            self._ready.add(i)
+            if error is not None:
+                self.errors[i] = error
+                return
+        if self.pyramids is None or k in self._stored or self._closed:
+            return
+        levels = {level: self.store.series((k, level)) for level in self.pyramids.levels}
+        if any(stack is None for stack in levels.values()):
+            return  # file not fully decoded yet
+        try:
+            self.pyramids.save(f.path, levels)
+            del levels  # keep no references into the store's spill files
+            stored = self.pyramids.load(f.path)
+            if stored is not None:
+                self._stored[k] = stored
+        except Exception as e:
+            print(f"[FrameProvider] Could not store pyramid for {f.path}: {e}")
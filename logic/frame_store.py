@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+# default in-memory budget for decoded viewer frames
+FRAME_BUDGET_BYTES = int(os.getenv("VIEWER_FRAME_BUDGET_MB", "512")) * 1024 ** 2
+
+
+def compact_dtype(a: np.ndarray) -> np.dtype:
+    """
+    Smallest of uint8 / int16 / uint16 that holds `a` (rounded), else float32.
+    """
+    if a.dtype == np.uint8:
+        return np.dtype(np.uint8)
+    lo, hi = float(a.min()), float(a.max())
+    for dtype in (np.uint8, np.int16, np.uint16):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.float32)
+
+
+class _Block:
+    def __init__(self, count: int, frame_shape: Tuple[int, ...], dtype: np.dtype):
+        self.data = np.empty((count,) + frame_shape, dtype=dtype)
+        self.filled = np.zeros(count, dtype=bool)
+        self.windows = np.full((count, 2), np.nan, dtype=np.float32)  # NaN: shown as stored
+        self.path: Optional[str] = None  # spill file once evicted from memory
+
+    @property
+    def resident(self) -> int:
+        return 0 if self.path is not None else self.data.nbytes
+
+
+class FrameStore:
+    """
+    Decoded frames of a case, one contiguous array per series (file).
+
+    Frames are kept at their source precision and channel count: grayscale
+    DICOM as int16/uint16 values after the LUTs, together with the display
+    window for each frame, and PNG/JPG as uint8. They are expanded to 8-bit
+    only at display time (`FrameProvider.get`), where the viewer converts them
+    to RGB when it blends the heatmap.
+
+    Series arrays held in memory are limited to `budget_bytes`. The least
+    recently used ones are written to a spill file in `spill_dir` and
+    memory-mapped from there, so the OS can drop their pages under pressure
+    and reading them back needs no decoding.
+    """
+
+    def __init__(self, spill_dir: str, budget_bytes: int = FRAME_BUDGET_BYTES):
+        os.makedirs(spill_dir, exist_ok=True)
+        self.spill_dir = tempfile.mkdtemp(dir=spill_dir, prefix="frames-")
+        self.budget_bytes = budget_bytes
+        self._blocks: "OrderedDict[Hashable, _Block]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.spills = 0
+
+    def put(self, key: Hashable, count: int, index: int, frame: np.ndarray,
+            window: Optional[Tuple[float, float]] = None) -> None:
+        """
+        Store `frame` as frame `index` of the `count`-frame series `key`.
+        """
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None:
+                block = _Block(count, frame.shape, compact_dtype(frame))
+                self._blocks[key] = block
+            elif not np.can_cast(compact_dtype(frame), block.data.dtype, casting="safe"):
+                self._widen(block, frame)
+            self._blocks.move_to_end(key)
+            block.data[index] = np.rint(frame) if block.data.dtype.kind in "iu" and frame.dtype.kind == "f" else frame
+            block.filled[index] = True
+            if window is not None:
+                block.windows[index] = window
+            self._enforce_budget()
+
+    def get(self, key: Hashable, index: int) -> Optional[Tuple[np.ndarray, Optional[Tuple[float, float]]]]:
+        """
+        (frame, display window or None) if stored.
+        """
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None or not block.filled[index]:
+                return None
+            self._blocks.move_to_end(key)
+            lo, hi = block.windows[index]
+            # a copy out of a spill file, so no caller keeps the mapping (and the file) open
+            frame = block.data[index] if block.path is None else np.array(block.data[index])
+            return frame, (None if np.isnan(lo) else (float(lo), float(hi)))
+
+    def has(self, key: Hashable, index: int) -> bool:
+        with self._lock:
+            block = self._blocks.get(key)
+            return block is not None and bool(block.filled[index])
+
+    def series(self, key: Hashable) -> Optional[np.ndarray]:
+        """
+        The whole (frames, ...) array of series `key` once every frame is stored.
+        """
+        with self._lock:
+            block = self._blocks.get(key)
+            return block.data if block is not None and block.filled.all() else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "series": len(self._blocks),
+                "resident_bytes": sum(b.resident for b in self._blocks.values()),
+                "spilled_bytes": sum(b.data.nbytes for b in self._blocks.values() if b.path is not None),
+                "spills": self.spills,
+            }
+
+    def close(self) -> None:
+        """
+        Drop every series and delete the spill directory. Call it once no
+        thread is writing any more; memory maps are released first, since
+        Windows refuses to delete a mapped file. Anything still locked is left
+        for `MongoDB.clean_cache`.
+        """
+        with self._lock:
+            for block in self._blocks.values():
+                block.data = None
+            self._blocks.clear()
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def _widen(self, block: _Block, frame: np.ndarray) -> None:
+        # a later frame needs a wider type than the first one did
+        dtype = np.promote_types(block.data.dtype, compact_dtype(frame))
+        if dtype.kind in "iu" and np.dtype(dtype).itemsize > 2:
+            dtype = np.dtype(np.float32)
+        spilled = block.path
+        block.data = block.data.astype(dtype)  # back in memory; the old map is no longer referenced
+        block.path = None
+        if spilled is not None:
+            try:
+                os.remove(spilled)
+            except OSError:
+                pass  # still mapped by a reader; removed with the directory in close()
+
+    def _enforce_budget(self) -> None:
+        resident = sum(b.resident for b in self._blocks.values())
+        for key, block in list(self._blocks.items())[:-1]:  # never the series just written
+            if resident <= self.budget_bytes:
+                break
+            if block.path is not None:
+                continue
+            path = os.path.join(self.spill_dir, f"{self.spills}.npy")
+            spilled = np.lib.format.open_memmap(path, mode="w+", dtype=block.data.dtype, shape=block.data.shape)
+            spilled[:] = block.data
+            spilled.flush()
+            resident -= block.data.nbytes
+            block.data, block.path = spilled, path
+            self.spills += 1
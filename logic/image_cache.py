@@ -0,0 +1,377 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from logic.downloads import FileProgress, stream_to_file
+from logic.uploads import sha256_file
+
+MANIFEST_FILE = "manifest.sqlite3"
+MANIFEST_VERSION = 1
+
+
+class ImageCache:
+    """
+    Content-addressed, size-bounded LRU cache for GridFS images.
+
+    Files live at `<root>/<key[:2]>/<key><ext>` where `key` is the GridFS
+    ObjectId, so two scans that were both uploaded as `image.dcm` can never
+    collide. The original extension is kept because decoders dispatch on it.
+    Writes are atomic (temp file + rename) and hashed while streaming; a
+    cached file whose size no longer matches what was written, or whose
+    digest does not on its first hit in a process, is treated as corrupt
+    and fetched again. Once the total size exceeds `max_bytes`, the least
+    recently used entries are evicted, except those touched within
+    `min_age_seconds` (typically the case that is open right now). Files
+    the manifest does not list are removed by `sweep_orphans`, which the
+    background cache cleanup runs.
+
+    Size, digest, last access and source ref of every file are kept in a
+    small SQLite manifest next to the files, so opening the cache and
+    choosing eviction victims are indexed queries rather than a directory
+    walk. The manifest is rebuilt from disk when it is missing, unreadable
+    or from another format version. Files derived from a cached image (the
+    viewer's pyramid levels) are registered with `add_derived`, so they share
+    the byte budget and are deleted when their source is.
+    """
+
+    def __init__(self, root: str, max_bytes: int, min_age_seconds: float = 300.0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.min_age_seconds = min_age_seconds
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.corrupt = 0
+        self._verified = set()  # keys whose digest was checked (or computed) by this process
+        os.makedirs(self.root, exist_ok=True)
+        self._db = self._open_manifest()
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Return the cached path for `key` (and mark it recently used), or None.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT path, size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            path, expected = row
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = -1
+            if size != expected:
+                self.corrupt += 1
+                self.misses += 1
+                self._drop(key, path)
+                return None
+            verified = key in self._verified
+        # the first hit in this process re-hashes the file against its recorded digest
+        if not verified:
+            if not self.verify(key):
+                with self._lock:
+                    self.misses += 1
+                return None
+        with self._lock:
+            with self._db:
+                self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return path
+
+    def digest_for(self, path: str) -> Optional[str]:
+        """
+        The recorded sha256 of a cached file, if this process has verified or written it.
+        """
+        key = self.key_for_path(path)
+        with self._lock:
+            if key is None or key not in self._verified:
+                return None
+            row = self._db.execute("SELECT path, sha256 FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or os.path.abspath(row[0]) != os.path.abspath(path):
+            return None
+        return row[1]
+
+    def key_for_path(self, path: str) -> Optional[str]:
+        """
+        The key a cached file was stored under, or None if `path` is not inside this cache.
+        """
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(path)
+        if os.path.dirname(os.path.dirname(path)) != root:
+            return None
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def put_stream(self, key: str, grid_out, ext: str = "", progress: Optional[FileProgress] = None) -> str:
+        """
+        Stream a GridOut into the cache under `key` and return its path.
+        """
+        path = self._path_for(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        hasher = hashlib.sha256()
+        stream_to_file(grid_out, path, ref=key, progress=progress, hasher=hasher)
+        size = os.path.getsize(path)
+        expected = getattr(grid_out, "length", None)
+        if expected is not None and size != int(expected):
+            os.remove(path)
+            raise IOError(f"Downloaded {size} bytes for {key}, expected {expected}")
+        self._add(key, path, size, hasher.hexdigest(), source_ref=key)
+        with self._lock:
+            self._verified.add(key)
+        return path
+
+    def touch(self, key: str) -> bool:
+        """
+        Mark `key` recently used without counting a hit; False if it is not in the manifest.
+        """
+        with self._lock:
+            with self._db:
+                updated = self._db.execute(
+                    "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+                ).rowcount
+        return updated > 0
+
+    def add_derived(self, key: str, path: str, source_ref: Optional[str] = None) -> None:
+        """
+        Account for a file built from a cached one (e.g. a pyramid level) under `key`.
+
+        It counts toward `max_bytes` and ages like any other entry, and is
+        dropped together with `source_ref` when that entry goes.
+        """
+        self._add(key, path, os.path.getsize(path), None, source_ref=source_ref)
+
+    def verify(self, key: str) -> bool:
+        """
+        Re-hash a cached file against the digest recorded when it was written.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT path, sha256 FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False
+        path, digest = row
+        if digest is None:
+            return os.path.exists(path)
+        try:
+            ok = sha256_file(path) == digest
+        except OSError:
+            ok = False
+        with self._lock:
+            if not ok:
+                self.corrupt += 1
+                self._drop(key, path)
+                self._verified.discard(key)
+                return False
+            self._verified.add(key)
+        return True
+
+    def evict(self, max_age_seconds: Optional[float] = None) -> int:
+        """
+        Evict LRU entries until within budget, and any entry idle for longer
+        than `max_age_seconds`. Returns the number of bytes freed.
+        """
+        freed = 0
+        now = time.time()
+        protect_after = now - self.min_age_seconds
+        with self._lock:
+            if max_age_seconds is not None:
+                cutoff = min(now - max_age_seconds, protect_after)
+                rows = self._db.execute(
+                    "SELECT key, path, size FROM entries WHERE last_access < ? ORDER BY last_access",
+                    (cutoff,),
+                ).fetchall()
+                for key, path, size in rows:
+                    freed += self._evict_one(key, path, size)
+
+            excess = self.total_bytes() - self.max_bytes
+            if excess > 0:
+                cursor = self._db.execute(
+                    "SELECT key, path, size FROM entries WHERE last_access < ? ORDER BY last_access",
+                    (protect_after,),
+                )
+                victims = []
+                for key, path, size in cursor:
+                    if excess <= 0:
+                        break
+                    victims.append((key, path, size))
+                    excess -= size
+                for key, path, size in victims:
+                    freed += self._evict_one(key, path, size)
+        return freed
+
+    def sweep_orphans(self, *derived_roots: str) -> int:
+        """
+        Delete files on disk that the manifest does not know about (left by a
+        crash between writing a file and recording it, or derived files whose
+        rows a rebuild dropped); returns the bytes freed. `derived_roots` are
+        directories of `add_derived` files to sweep as well. This walks the
+        whole cache, so it belongs in background maintenance, not on the open
+        path. Recent files are kept: another process sharing the manifest may
+        be about to record them.
+        """
+        with self._lock:
+            known = {os.path.abspath(p) for (p,) in self._db.execute("SELECT path FROM entries")}
+        cutoff = time.time() - self.min_age_seconds
+        freed = 0
+        for root in (self.root,) + derived_roots:
+            for _key, path, size, last_access in self._scan(root):
+                if os.path.abspath(path) not in known and last_access < cutoff:
+                    self._remove_file(path)
+                    freed += size
+        return freed
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return int(self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0])
+
+    def rebuild(self) -> None:
+        """
+        Re-index the files on disk, discarding whatever the manifest said.
+        """
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM entries")
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entries (key, path, size, sha256, last_access, source_ref) "
+                    "VALUES (?, ?, ?, NULL, ?, ?)",
+                    ((key, path, size, last_access, key) for key, path, size, last_access in self._scan()),
+                )
+        print(f"[ImageCache] Rebuilt manifest for {self.root}: {self.stats()['entries']} file(s)")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = int(self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0])
+            return {
+                "entries": entries,
+                "bytes": self.total_bytes(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+                "corrupt": self.corrupt,
+            }
+
+    # -------------------------------------------------------------------------
+    # Internal helpers
+    # -------------------------------------------------------------------------
+
+    def _path_for(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}{ext.lower()}")
+
+    def _open_manifest(self) -> sqlite3.Connection:
+        path = os.path.join(self.root, MANIFEST_FILE)
+        fresh = not os.path.exists(path)
+        try:
+            db = self._connect(path)
+            if not fresh and not self._manifest_ok(db):
+                db.close()
+                raise sqlite3.DatabaseError("manifest inconsistent")
+        except sqlite3.DatabaseError:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(path + suffix)
+                except OSError:
+                    pass
+            fresh = True
+            db = self._connect(path)
+
+        self._db = db
+        if fresh:
+            self.rebuild()
+        return db
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        # one connection shared by the app's threads, serialized by self._lock;
+        # WAL lets the bulk scorer's worker processes use the same manifest
+        db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        with db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " path TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " sha256 TEXT,"
+                " last_access REAL NOT NULL,"
+                " source_ref TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            db.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('version', ?)", (str(MANIFEST_VERSION),))
+        return db
+
+    @staticmethod
+    def _manifest_ok(db: sqlite3.Connection) -> bool:
+        row = db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        if row is None or row[0] != str(MANIFEST_VERSION):
+            return False
+        return db.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+
+    def _add(self, key: str, path: str, size: int, sha256: Optional[str], source_ref: Optional[str]) -> None:
+        with self._lock:
+            old = self._db.execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+            if old is not None and old[0] != path:
+                self._remove_file(old[0])
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, path, size, sha256, last_access, source_ref) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, path, size, sha256, time.time(), source_ref),
+                )
+        self.evict()
+
+    def _evict_one(self, key: str, path: str, size: int) -> int:
+        if self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is None:
+            return 0  # already dropped along with its source
+        size += self._drop(key, path)
+        self.evictions += 1
+        self.evicted_bytes += size
+        return size
+
+    def _drop(self, key: str, path: str) -> int:
+        """
+        Forget `key` and delete its file and the files derived from it; returns the derived bytes.
+        """
+        derived = self._db.execute(
+            "SELECT path, size FROM entries WHERE source_ref = ? AND key != ?", (key, key)
+        ).fetchall()
+        with self._db:
+            self._db.execute("DELETE FROM entries WHERE key = ? OR source_ref = ?", (key, key))
+        self._remove_file(path)
+        for derived_path, _size in derived:
+            self._remove_file(derived_path)
+        return sum(size for _path, size in derived)
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _scan(self, top: Optional[str] = None):
+        """
+        Yield (key, path, size, last_access) for every cached file on disk (under `top`, default the root).
+        """
+        now = time.time()
+        for root, _dirs, files in os.walk(top or self.root):
+            for name in files:
+                if name.startswith(MANIFEST_FILE):
+                    continue
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                if name.startswith(".part-"):
+                    if now - st.st_mtime > 3600:
+                        self._remove_file(path)  # leftover from an interrupted download
+                    continue
+                yield os.path.splitext(name)[0], path, st.st_size, max(st.st_atime, st.st_mtime)
@@ -1,6 +1,11 @@
+import functools
+import os
+from typing import List, Tuple
+
 import numpy as np
 import pydicom
-from pydicom.pixel_data_handlers.util import apply_modality_lut, apply_voi_lut
+from PIL import Image
+from pydicom.pixels import apply_modality_lut, apply_voi_lut, pixel_array
 
 
 def dicom_to_gray_np(path: str) -> np.ndarray:
@@ -30,3 +35,214 @@ def dicom_to_gray_np(path: str) -> np.ndarray:
     arr *= 255.0
 
     return arr.astype(np.uint8)
+
+
+def _normalize_to_uint8(arr: np.ndarray) -> np.ndarray:
+    arr = arr.astype(np.float32, copy=True)
+    arr -= arr.min()
+    if arr.max() > 0:
+        arr /= arr.max()
+    arr *= 255.0
+    return arr.astype(np.uint8)
+
+
+def dicom_to_gray_frames(path: str) -> List[np.ndarray]:
+    """
+    Convert every frame of a (possibly multi-frame) DICOM to uint8 grayscale.
+
+    Each frame goes through the same LUT / MONOCHROME1 / min-max pipeline as
+    `dicom_to_gray_np`; colour frames are reduced to luminance first.
+    """
+    ds = pydicom.dcmread(path, force=True)
+    arr = ds.pixel_array.astype(np.float32)
+
+    try:
+        arr = apply_modality_lut(arr, ds)
+    except Exception:
+        pass
+
+    try:
+        arr = apply_voi_lut(arr, ds)
+    except Exception:
+        pass
+
+    samples = int(getattr(ds, "SamplesPerPixel", 1) or 1)
+    if samples > 1 and arr.shape[-1] in (3, 4):
+        arr = arr[..., :3].mean(axis=-1)
+
+    if arr.ndim == 2:
+        arr = arr[np.newaxis]
+
+    monochrome1 = str(getattr(ds, "PhotometricInterpretation", "")).upper() == "MONOCHROME1"
+    frames = []
+    for frame in arr:
+        if monochrome1:
+            frame = frame.max() - frame
+        frames.append(_normalize_to_uint8(frame))
+    return frames
+
+
+def display_window(a: np.ndarray) -> Tuple[float, float]:
+    """
+    (lo, hi) of the 1-99 percentile stretch for a grayscale frame, falling
+    back to min/max; hi <= lo means the frame is flat.
+    """
+    a = a.astype("float32")
+    if a.size >= 16:
+        lo, hi = np.percentile(a, (1, 99))
+    else:
+        lo, hi = float(a.min()), float(a.max())
+    if hi <= lo:
+        lo, hi = float(a.min()), float(a.max())
+    return float(lo), float(hi)
+
+
+def apply_window(a: np.ndarray, lo: float, hi: float) -> np.ndarray:
+    """
+    Map [lo, hi] linearly onto 0-255 (clipping outside) as uint8.
+    """
+    a = a.astype("float32")
+    if hi <= lo:
+        return (a * 0).astype("uint8")
+    a = np.clip(a, lo, hi)
+    a = (a - lo) / (hi - lo)
+    return (a * 255.0 + 0.5).astype("uint8")
+
+
+def _percentile_to_uint8(a: np.ndarray) -> np.ndarray:
+    return apply_window(a, *display_window(a))
+
+
+def dicom_to_display_arrays(path: str) -> List[np.ndarray]:
+    """
+    Decode DICOM for display (multi-frame, VOI/modality LUT, MONOCHROME1) -> list of
+    uint8 arrays, (rows, cols) for grayscale frames or (rows, cols, 3) for colour.
+
+    Grayscale frames get a 1-99 percentile stretch rather than min-max, which
+    keeps a few very bright or dark pixels from flattening the contrast.
+    """
+    return [f if f.ndim == 3 else _percentile_to_uint8(f) for f in dicom_display_sources(path)]
+
+
+def dicom_display_sources(path: str) -> List[np.ndarray]:
+    """
+    Frames of a DICOM after the modality/VOI LUTs and MONOCHROME1 inversion
+    but before the display stretch: full-precision (rows, cols) values for
+    grayscale, uint8 (rows, cols, 3) for colour.
+    """
+    ds = pydicom.dcmread(path, force=True)
+    try:
+        arr = ds.pixel_array  # uses installed pixel handlers
+    except Exception as e:
+        raise RuntimeError(
+            "Cannot decode DICOM pixel data. Install plugins:\n"
+            "pip install pylibjpeg pylibjpeg-libjpeg pylibjpeg-openjpeg\n"
+            "or: pip install gdcm"
+        ) from e
+
+    arr = _display_luts(arr, ds)
+
+    if arr.ndim == 2:
+        return [arr]
+    if arr.ndim == 3:
+        # grayscale multi-frame OR color single frame (rows, cols, 3)
+        if arr.shape[-1] in (3, 4):  # color
+            return [_rgb(arr)]
+        return [arr[i] for i in range(arr.shape[0])]
+    if arr.ndim == 4 and arr.shape[-1] in (3, 4):  # (frames, rows, cols, 3)
+        return [_rgb(arr[i]) for i in range(arr.shape[0])]
+    # fallback: first slice
+    return [arr[0]]
+
+
+def _display_luts(arr: np.ndarray, ds) -> np.ndarray:
+    # modality/voi LUTs
+    try:
+        arr = apply_modality_lut(arr, ds)
+    except Exception:
+        pass
+    try:
+        arr = apply_voi_lut(arr, ds)
+    except Exception:
+        pass
+
+    # MONOCHROME1 inversion
+    try:
+        if str(getattr(ds, "PhotometricInterpretation", "")).upper() == "MONOCHROME1":
+            arr = arr.max() - arr
+    except Exception:
+        pass
+    return arr
+
+
+def _rgb(frame: np.ndarray) -> np.ndarray:
+    if frame.dtype != "uint8":
+        frame = np.clip(frame, 0, 255).astype("uint8")
+    return np.ascontiguousarray(frame[..., :3])
+
+
+def read_dicom_header(path: str):
+    return pydicom.dcmread(path, stop_before_pixels=True, force=True)
+
+
+def dicom_frame_count(ds) -> int:
+    return int(getattr(ds, "NumberOfFrames", 1) or 1)
+
+
+def dicom_display_source(path: str, index: int, ds=None) -> np.ndarray:
+    """
+    Frame `index` of `dicom_display_sources(path)`, decoded without the other
+    frames; `ds` is the header, if already read.
+    """
+    try:
+        arr = pixel_array(path, index=index)
+    except Exception:
+        return _decoded_sources(path)[index]  # e.g. no preamble; raises the plugin hint if undecodable
+
+    arr = _display_luts(arr, ds if ds is not None else read_dicom_header(path))
+    if arr.ndim == 3 and arr.shape[-1] in (3, 4):
+        return _rgb(arr)
+    return arr
+
+
+def _decoded_sources(path: str) -> List[np.ndarray]:
+    st = os.stat(path)
+    return _decoded_sources_cached(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+@functools.lru_cache(maxsize=2)
+def _decoded_sources_cached(path: str, _mtime_ns: int, _size: int) -> List[np.ndarray]:
+    # whole-file fallback for files pydicom cannot decode frame by frame:
+    # decoded once and shared by the frames that follow (mtime/size key a changed file afresh)
+    return dicom_display_sources(path)
+
+
+def dicom_to_display_frames(path: str) -> List[Image.Image]:
+    """
+    Decode DICOM for display -> list of PIL RGBA (see `dicom_to_display_arrays`).
+    """
+    return [array_to_rgba(a) for a in dicom_to_display_arrays(path)]
+
+
+def array_to_rgba(a: np.ndarray) -> Image.Image:
+    return Image.fromarray(a, mode="L" if a.ndim == 2 else "RGB").convert("RGBA")
+
+
+def is_dicom(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            f.seek(128)
+            if f.read(4) == b"DICM":
+                return True
+    except Exception:
+        pass
+    # fallback: try reading header quickly
+    try:
+        pydicom.dcmread(path, stop_before_pixels=True, force=True)
+        return True
+    except Exception:
+        return False
+
+
+def image_to_display_array(img: Image.Image) -> np.ndarray:
+    return np.asarray(img.convert("L" if img.mode in ("L", "I", "I;16", "F") else "RGB"))
@@ -0,0 +1,140 @@
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from logic.image_utils import dicom_to_gray_np, dicom_to_gray_frames
+
+# progress(done, total, message); may raise to abort the running job
+ProgressCallback = Callable[[int, int, str], None]
+
+
+def predict_ct_section(img_path, model, scaler, img_size=64, class_names=None):
+    if img_path.lower().endswith(".dcm"):
+        img = dicom_to_gray_np(img_path)
+    else:
+        img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError(f"Could not read image: {img_path}")
+
+    img = cv2.resize(img, (img_size, img_size))
+    img = img.astype(np.float32) / 255.0
+    x = img.flatten().reshape(1, -1)
+
+    x_scaled = scaler.transform(x)
+    probs = model.predict_proba(x_scaled)[0]
+    pred_idx = np.argmax(probs)
+    pred_class = class_names[pred_idx] if class_names else pred_idx
+    return pred_class, probs
+
+
+def load_series_frames(img_paths: List[str],
+                       progress: Optional[ProgressCallback] = None) -> List[Tuple[str, int, np.ndarray]]:
+    """
+    Decode every image (and every frame of multi-frame DICOMs) of a series.
+
+    Returns (path, frame_index, uint8 grayscale array) tuples in series order.
+    `progress` is called once per file with one extra step left for prediction.
+    """
+    out = []
+    total = len(img_paths) + 1
+    for n, path in enumerate(img_paths):
+        if path.lower().endswith(".dcm"):
+            frames = dicom_to_gray_frames(path)
+        else:
+            img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                raise ValueError(f"Could not read image: {path}")
+            frames = [img]
+        for i, frame in enumerate(frames):
+            out.append((path, i, frame))
+        if progress:
+            progress(n + 1, total, f"Decoded {os.path.basename(path)}")
+    return out
+
+
+def preprocess_frames(frames: List[np.ndarray], img_size=64) -> np.ndarray:
+    """
+    Resize and flatten grayscale frames into one (n, img_size**2) float32 matrix.
+    """
+    x = np.empty((len(frames), img_size * img_size), dtype=np.float32)
+    for i, frame in enumerate(frames):
+        x[i] = cv2.resize(frame, (img_size, img_size)).reshape(-1)
+    x *= np.float32(1.0 / 255.0)
+    return x
+
+
+def aggregate_probs(probs: np.ndarray, top_k: int = 3) -> Dict[str, Any]:
+    """
+    Case-level summary of per-slice probabilities (shape (n_slices, n_classes)).
+
+    `top_k` is the per-class mean of the k most confident slices, which keeps
+    a few strongly positive slices from being washed out by normal anatomy.
+    """
+    k = max(1, min(top_k, probs.shape[0]))
+    top = np.sort(probs, axis=0)[-k:]
+    return {
+        "mean": probs.mean(axis=0).tolist(),
+        "max": probs.max(axis=0).tolist(),
+        "top_k": top.mean(axis=0).tolist(),
+        "k": k,
+    }
+
+
+def predict_ct_series(img_paths: List[str], model, scaler, img_size=64, class_names=None,
+                      top_k: int = 3, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Score every slice of a series with a single scaler.transform + predict_proba call.
+    """
+    decoded = load_series_frames(img_paths, progress=progress)
+    if not decoded:
+        raise ValueError("Case has no CT images to score.")
+
+    x = preprocess_frames([frame for _, _, frame in decoded], img_size=img_size)
+    probs = model.predict_proba(scaler.transform(x))
+
+    slices = []
+    image_index = {path: i for i, path in reversed(list(enumerate(img_paths)))}
+    for (path, frame_idx, _), p in zip(decoded, probs):
+        pred_idx = int(np.argmax(p))
+        slices.append({
+            "path": path,
+            "image": image_index[path],
+            "frame": frame_idx,
+            "probs": p.tolist(),
+            "pred_class": class_names[pred_idx] if class_names else pred_idx,
+        })
+
+    aggregate = aggregate_probs(probs, top_k=top_k)
+    pred_idx = int(np.argmax(aggregate["mean"]))
+    aggregate["pred_class"] = class_names[pred_idx] if class_names else pred_idx
+    if progress:
+        progress(len(img_paths) + 1, len(img_paths) + 1, f"Scored {len(slices)} slices")
+    return {"slices": slices, "probs": probs, "aggregate": aggregate}
+
+
+def build_ai_result(series: Dict[str, Any], session, input_hash: str) -> Dict[str, Any]:
+    """
+    Turn `predict_ct_series` output into the `ai_result` document stored in MongoDB.
+    """
+    probs = series["aggregate"]["mean"]
+    top_name = "TTF-1" if probs[0] > probs[1] else "CK7"
+    n = len(series["slices"])
+    return {
+        "biomarkers": [
+            {"name": "TTF-1", "value": float(probs[0])},
+            {"name": "CK7", "value": float(probs[1])},
+        ],
+        "explanation": (
+            f"The model predicts the CT series belongs to class {top_name} with mean probability "
+            f"{max(probs[0], probs[1]):.3f} over {n} slice{'s' if n != 1 else ''}."
+        ),
+        "slices": [{k: v for k, v in sl.items() if k != "path"} for sl in series["slices"]],
+        "aggregate": series["aggregate"],
+        "model_version": session.version,
+        "model_fingerprint": session.fingerprint,
+        "input_hash": input_hash,
+        "scored_at": time.time(),
+    }
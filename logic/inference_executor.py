@@ -0,0 +1,90 @@
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class InferenceCancelled(Exception):
+    """Raised inside a worker when its job has been cancelled."""
+
+
+class InferenceJob:
+    """
+    Handle for one background inference run.
+
+    The worker reports progress through `report`, which doubles as the
+    cancellation point: once `cancel()` was called the next report raises
+    InferenceCancelled and the job unwinds without producing a result.
+    The UI only ever reads `progress`, `done()` and `outcome()`, so it can
+    poll the job from `after()` without touching worker state.
+    """
+
+    def __init__(self, job_id: int, key: Any):
+        self.job_id = job_id
+        self.key = key
+        self.future: Optional[Future] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._progress: Tuple[int, int, str] = (0, 0, "Queued")
+
+    @property
+    def progress(self) -> Tuple[int, int, str]:
+        with self._lock:
+            return self._progress
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def report(self, done: int, total: int, message: str = "") -> None:
+        if self._cancel.is_set():
+            raise InferenceCancelled(f"Job {self.job_id} cancelled")
+        with self._lock:
+            self._progress = (done, total, message)
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def outcome(self) -> Dict[str, Any]:
+        """
+        Result of a finished job as {"status": ..., "result"/"error": ...}.
+        """
+        if self.cancelled or self.future.cancelled():
+            return {"status": "cancelled"}
+        err = self.future.exception()
+        if isinstance(err, InferenceCancelled):
+            return {"status": "cancelled"}
+        if err is not None:
+            return {"status": "error", "error": err}
+        return {"status": "ok", "result": self.future.result()}
+
+
+class InferenceExecutor:
+    """
+    Small thread pool that runs `fn(payload, progress=job.report)` off the Tk thread.
+
+    NumPy, OpenCV and sklearn release the GIL for the heavy parts, so a
+    thread keeps the UI responsive without the pickling cost of a process.
+    """
+
+    def __init__(self, max_workers: int = 1):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._ids = itertools.count(1)
+
+    def submit(self, fn: Callable[..., Any], payload: Any, key: Any = None) -> InferenceJob:
+        job = InferenceJob(next(self._ids), key)
+        job.future = self._pool.submit(self._run, job, fn, payload)
+        return job
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _run(job: InferenceJob, fn: Callable[..., Any], payload: Any) -> Any:
+        job.report(0, 0, "Starting")
+        return fn(payload, progress=job.report)
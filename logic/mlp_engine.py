@@ -0,0 +1,416 @@
+"""
+Pure-NumPy forward pass for the exported MLP.
+
+    python -m logic.mlp_engine export
+
+reads `mlp.joblib` + `scaler.joblib`, folds the StandardScaler into the first
+layer and writes every layer as float32 arrays to `mlp.npz`. `NumpyMLP` then
+computes probabilities from raw [0, 1] pixel features with a few matmuls, so
+neither sklearn nor its input validation is needed at inference time.
+
+    python -m logic.mlp_engine quantize --dtype int8 --holdout data/ct_sections/test
+
+writes a memory-mappable variant (`mlp_<dtype>/`: one `.npy` per array plus
+`meta.json`) and reports its accuracy drift against the float32 model.
+Loading it maps the files read-only, so startup is near zero and every
+process on the host shares the same pages.
+
+Only the float32 variant is used in place. float16 and int8 weights have to
+be upcast before the matmul: each engine does that once, on its first
+predict, and keeps the float32 copy, so a call costs the same as float32
+afterwards, but that copy is private to the process (the smaller files then
+only save disk and load time). Upcasting on every call instead made a batch-1
+predict roughly 8x slower.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+NPZ_FILE = "mlp.npz"
+MAPPED_FORMAT = "lct-mlp-mapped"
+MAPPED_META = "meta.json"
+MAPPED_DTYPES = ("float32", "float16", "int8")
+
+
+def mapped_dir_name(dtype: str) -> str:
+    return f"mlp_{dtype}"
+
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def _tanh(x):
+    return np.tanh(x, out=x)
+
+
+def _logistic(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1.0
+    return np.reciprocal(x, out=x)
+
+
+def _identity(x):
+    return x
+
+
+def _softmax(x):
+    x -= x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+ACTIVATIONS = {"relu": _relu, "tanh": _tanh, "logistic": _logistic, "identity": _identity}
+
+
+def fold_scaler(model, scaler) -> Dict[str, Any]:
+    """
+    Return float32 layer arrays with `scaler.transform` folded into layer 0.
+
+    (x - mean) / scale @ W + b  ==  x @ (W / scale[:, None]) + (b - (mean / scale) @ W)
+    """
+    coefs = [np.asarray(w, dtype=np.float64) for w in model.coefs_]
+    intercepts = [np.asarray(b, dtype=np.float64) for b in model.intercepts_]
+    n_in = coefs[0].shape[0]
+
+    mean = scaler.mean_ if getattr(scaler, "mean_", None) is not None else np.zeros(n_in)
+    scale = scaler.scale_ if getattr(scaler, "scale_", None) is not None else np.ones(n_in)
+    mean = np.asarray(mean, dtype=np.float64)
+    scale = np.asarray(scale, dtype=np.float64)
+
+    w0 = coefs[0] / scale[:, None]
+    b0 = intercepts[0] - (mean / scale) @ coefs[0]
+    coefs[0], intercepts[0] = w0, b0
+
+    arrays: Dict[str, Any] = {
+        "n_layers": np.array(len(coefs)),
+        "activation": np.array(model.activation),
+        "out_activation": np.array(model.out_activation_),
+    }
+    for i, (w, b) in enumerate(zip(coefs, intercepts)):
+        arrays[f"W{i}"] = np.ascontiguousarray(w, dtype=np.float32)
+        arrays[f"b{i}"] = np.ascontiguousarray(b, dtype=np.float32)
+    return arrays
+
+
+def export_npz(model, scaler, path: str, class_names: Optional[List[str]] = None) -> str:
+    arrays = fold_scaler(model, scaler)
+    if class_names is not None:
+        arrays["class_names"] = np.array(class_names)
+    np.savez(path, **arrays)
+    return path
+
+
+class NumpyMLP:
+    """
+    float32 MLP inference engine with the sklearn-compatible `predict_proba`.
+
+    Inputs are the raw flattened pixels in [0, 1]; the scaler lives inside
+    the first layer, so pair it with `PassthroughScaler` where a scaler is
+    expected.
+    """
+
+    def __init__(self, weights: List[np.ndarray], biases: List[np.ndarray],
+                 activation: str = "relu", out_activation: str = "softmax",
+                 class_names: Optional[List[str]] = None,
+                 scales: Optional[List[Optional[np.ndarray]]] = None):
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation: {activation}")
+        self.weights = weights
+        self.biases = biases
+        # per-output-column dequantisation factors for int8 layers (None = unquantised)
+        self.scales = scales or [None] * len(weights)
+        self.activation = activation
+        self.out_activation = out_activation
+        self.class_names = class_names
+        self._float_weights: List[Optional[np.ndarray]] = [None] * len(weights)
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyMLP":
+        with np.load(path, allow_pickle=False) as z:
+            n = int(z["n_layers"])
+            weights = [np.ascontiguousarray(z[f"W{i}"], dtype=np.float32) for i in range(n)]
+            biases = [np.ascontiguousarray(z[f"b{i}"], dtype=np.float32) for i in range(n)]
+            class_names = z["class_names"].tolist() if "class_names" in z.files else None
+            return cls(weights, biases, str(z["activation"]), str(z["out_activation"]), class_names)
+
+    @classmethod
+    def load_mapped(cls, directory: str) -> "NumpyMLP":
+        """
+        Open a `write_mapped` directory with every array memory-mapped read-only.
+        """
+        meta = read_mapped_meta(directory)
+        weights, biases, scales = [], [], []
+        for layer in meta["layers"]:
+            weights.append(np.load(os.path.join(directory, layer["W"]), mmap_mode="r"))
+            biases.append(np.load(os.path.join(directory, layer["b"]), mmap_mode="r"))
+            scales.append(np.load(os.path.join(directory, layer["scale"]), mmap_mode="r") if layer["scale"] else None)
+        return cls(weights, biases, meta["activation"], meta["out_activation"], meta.get("class_names"), scales)
+
+    def _float_weight(self, i: int) -> np.ndarray:
+        w = self.weights[i]
+        if w.dtype == np.float32 and self.scales[i] is None:
+            return w  # used straight from the (mapped) file
+        cached = self._float_weights[i]
+        if cached is None:
+            # float16/int8: upcast (and dequantise) once per engine, not per call
+            cached = np.asarray(w, dtype=np.float32)
+            if self.scales[i] is not None:
+                cached = cached * np.asarray(self.scales[i], dtype=np.float32)
+            self._float_weights[i] = cached
+        return cached
+
+    @property
+    def n_features(self) -> int:
+        return self.weights[0].shape[0]
+
+    def predict_proba(self, x: np.ndarray) -> np.ndarray:
+        h = np.asarray(x, dtype=np.float32)
+        if h.ndim == 1:
+            h = h.reshape(1, -1)
+        act = ACTIVATIONS[self.activation]
+        last = len(self.weights) - 1
+        for i, b in enumerate(self.biases):
+            h = h @ self._float_weight(i)
+            h += b
+            if i < last:
+                act(h)
+
+        if self.out_activation == "softmax":
+            return _softmax(h)
+        if self.out_activation == "logistic":
+            p = _logistic(h)
+            return np.hstack([1.0 - p, p])
+        return h
+
+
+class PassthroughScaler:
+    """Stands in for StandardScaler when the scaling is already folded into the model."""
+
+    def transform(self, x):
+        return x
+
+
+def quantize_int8(w: np.ndarray):
+    """
+    Symmetric per-output-column int8 quantisation: w ~= q * scale.
+    """
+    w = np.asarray(w, dtype=np.float32)
+    scale = np.abs(w).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.rint(w / scale), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+def write_mapped(arrays: Dict[str, Any], directory: str, dtype: str = "float16",
+                 class_names: Optional[List[str]] = None, source: Optional[str] = None) -> str:
+    """
+    Write folded layer arrays (see `fold_scaler`) as a memory-mappable directory.
+
+    Weights are stored as `dtype`; biases and int8 scales stay float32. The
+    directory is built next to its destination and swapped in with a rename,
+    so readers never see a half-written model.
+    """
+    if dtype not in MAPPED_DTYPES:
+        raise ValueError(f"Unsupported dtype '{dtype}', expected one of {MAPPED_DTYPES}")
+    tmp = directory.rstrip("/\\") + ".tmp"
+    if os.path.isdir(tmp):
+        for name in os.listdir(tmp):
+            os.remove(os.path.join(tmp, name))
+    os.makedirs(tmp, exist_ok=True)
+
+    h = hashlib.sha256()
+    layers = []
+    for i in range(int(arrays["n_layers"])):
+        w, b = arrays[f"W{i}"], arrays[f"b{i}"]
+        entry = {"W": f"W{i}.npy", "b": f"b{i}.npy", "scale": None, "shape": list(w.shape)}
+        files = {}
+        if dtype == "int8":
+            q, scale = quantize_int8(w)
+            files[entry["W"]] = q
+            entry["scale"] = f"s{i}.npy"
+            files[entry["scale"]] = scale
+        else:
+            files[entry["W"]] = np.ascontiguousarray(w, dtype=dtype)
+        files[entry["b"]] = np.ascontiguousarray(b, dtype=np.float32)
+        for name, arr in files.items():
+            np.save(os.path.join(tmp, name), arr)
+            h.update(name.encode("utf-8"))
+            h.update(arr.tobytes())
+        layers.append(entry)
+
+    meta = {
+        "format": MAPPED_FORMAT,
+        "format_version": 1,
+        "dtype": dtype,
+        "activation": str(arrays["activation"]),
+        "out_activation": str(arrays["out_activation"]),
+        "class_names": list(class_names) if class_names is not None else None,
+        "layers": layers,
+        "content_sha256": h.hexdigest(),
+        "source": source,
+    }
+    with open(os.path.join(tmp, MAPPED_META), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    if os.path.isdir(directory):
+        old = directory.rstrip("/\\") + ".old"
+        os.replace(directory, old)
+        os.replace(tmp, directory)
+        for name in os.listdir(old):
+            os.remove(os.path.join(old, name))
+        os.rmdir(old)
+    else:
+        os.replace(tmp, directory)
+    return directory
+
+
+def read_mapped_meta(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, MAPPED_META)) as f:
+        meta = json.load(f)
+    if meta.get("format") != MAPPED_FORMAT:
+        raise ValueError(f"{directory} is not a mapped MLP directory")
+    return meta
+
+
+def load_holdout(root_dir: str, class_names: List[str], img_size: int = 64):
+    """
+    Load a held-out split laid out as `<root>/<class folder>/*.png` (the
+    training notebook's layout; folder suffixes like `_N0_M0_Ib` are ignored).
+    """
+    import cv2
+
+    xs, ys = [], []
+    for folder in sorted(os.listdir(root_dir)):
+        label = next((i for i, c in enumerate(class_names)
+                      if folder.lower() == c.lower() or folder.lower().startswith(c.lower() + "_")), None)
+        if label is None:
+            continue
+        for ext in ("*.png", "*.jpg", "*.jpeg", "*.bmp"):
+            for path in glob.glob(os.path.join(root_dir, folder, ext)):
+                img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                if img is None:
+                    continue
+                xs.append(cv2.resize(img, (img_size, img_size)).reshape(-1))
+                ys.append(label)
+    if not xs:
+        raise ValueError(f"No labelled images found under {root_dir}")
+    return np.asarray(xs, dtype=np.float32) / 255.0, np.asarray(ys, dtype=np.int64)
+
+
+def accuracy_drift(reference: NumpyMLP, candidate: NumpyMLP, x: np.ndarray,
+                   y: Optional[np.ndarray] = None) -> Dict[str, float]:
+    """
+    Compare a (quantised) candidate against the float32 reference on `x`.
+    """
+    ref = reference.predict_proba(x)
+    out = candidate.predict_proba(x)
+    report = {
+        "samples": int(x.shape[0]),
+        "max_abs_diff": float(np.max(np.abs(ref - out))),
+        "mean_abs_diff": float(np.mean(np.abs(ref - out))),
+        "top1_agreement": float(np.mean(ref.argmax(axis=1) == out.argmax(axis=1))),
+    }
+    if y is not None:
+        report["reference_accuracy"] = float(np.mean(ref.argmax(axis=1) == y))
+        report["candidate_accuracy"] = float(np.mean(out.argmax(axis=1) == y))
+        report["accuracy_drop"] = report["reference_accuracy"] - report["candidate_accuracy"]
+    return report
+
+
+def max_abs_diff(model, scaler, engine: NumpyMLP, x: np.ndarray) -> float:
+    """
+    Largest absolute probability difference between sklearn and the NumPy engine.
+    """
+    ref = model.predict_proba(scaler.transform(x))
+    out = engine.predict_proba(x)
+    return float(np.max(np.abs(ref - out)))
+
+
+def export_from_dir(models_dir: str, n_check: int = 256, atol: float = 1e-4) -> str:
+    import joblib
+
+    models_dir = Path(models_dir)
+    model = joblib.load(str(models_dir / "mlp.joblib"))
+    scaler = joblib.load(str(models_dir / "scaler.joblib"))
+    class_names = np.load(str(models_dir / "class_names.npy"), allow_pickle=True).tolist()
+
+    out = str(models_dir / NPZ_FILE)
+    export_npz(model, scaler, out, class_names=class_names)
+
+    engine = NumpyMLP.load(out)
+    rng = np.random.default_rng(0)
+    x = rng.random((n_check, engine.n_features), dtype=np.float32)
+    diff = max_abs_diff(model, scaler, engine, x)
+    print(f"[mlp_engine] Wrote {out}; max |sklearn - numpy| over {n_check} samples = {diff:.2e}")
+    if diff > atol:
+        os.remove(out)
+        raise RuntimeError(f"Exported engine deviates from sklearn by {diff:.2e} (> {atol:.0e}); export removed.")
+    return out
+
+
+def quantize_from_dir(models_dir: str, dtype: str, holdout: Optional[str] = None,
+                      max_drop: float = 0.01, n_random: int = 512) -> Dict[str, Any]:
+    """
+    Write `mlp_<dtype>/` from `mlp.npz` and check its drift against float32.
+
+    With a labelled `holdout` directory the export is rejected (and removed)
+    when accuracy drops by more than `max_drop`; without one, drift is only
+    reported on random inputs.
+    """
+    models_dir = Path(models_dir)
+    npz = models_dir / NPZ_FILE
+    if not npz.exists():
+        export_from_dir(str(models_dir))
+    reference = NumpyMLP.load(str(npz))
+    with np.load(str(npz), allow_pickle=False) as z:
+        arrays = {k: z[k] for k in z.files}
+
+    out_dir = str(models_dir / mapped_dir_name(dtype))
+    write_mapped(arrays, out_dir, dtype=dtype, class_names=reference.class_names, source=NPZ_FILE)
+    candidate = NumpyMLP.load_mapped(out_dir)
+
+    if holdout:
+        x, y = load_holdout(holdout, reference.class_names or [])
+    else:
+        x = np.random.default_rng(0).random((n_random, reference.n_features), dtype=np.float32)
+        y = None
+    report = accuracy_drift(reference, candidate, x, y)
+    report["dtype"] = dtype
+    report["directory"] = out_dir
+    print(f"[mlp_engine] {dtype}: " + ", ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}"
+                                                for k, v in report.items() if k not in ("dtype", "directory")))
+    if y is not None and report["accuracy_drop"] > max_drop:
+        for name in os.listdir(out_dir):
+            os.remove(os.path.join(out_dir, name))
+        os.rmdir(out_dir)
+        raise RuntimeError(f"{dtype} export loses {report['accuracy_drop']:.2%} accuracy (> {max_drop:.2%}); removed.")
+    return report
+
+
+if __name__ == "__main__":
+    from logic.model_session import MODELS_DIR
+
+    p = argparse.ArgumentParser(description="Export the sklearn MLP to NumPy / memory-mapped inference formats.")
+    p.add_argument("command", choices=["export", "quantize"])
+    p.add_argument("--models-dir", default=str(MODELS_DIR))
+    p.add_argument("--check", type=int, default=256, help="random samples used to verify the export")
+    p.add_argument("--atol", type=float, default=1e-4)
+    p.add_argument("--dtype", choices=MAPPED_DTYPES, action="append",
+                   help="mapped weight dtype(s) for `quantize` (default: float32, float16 and int8)")
+    p.add_argument("--holdout", help="labelled held-out split (<dir>/<class>/*.png) for the drift check")
+    p.add_argument("--max-drop", type=float, default=0.01, help="max accepted accuracy drop on the holdout")
+    args = p.parse_args()
+    if args.command == "export":
+        export_from_dir(args.models_dir, n_check=args.check, atol=args.atol)
+    else:
+        for dtype in args.dtype or ["float32", "float16", "int8"]:
+            quantize_from_dir(args.models_dir, dtype, holdout=args.holdout, max_drop=args.max_drop)
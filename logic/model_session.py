@@ -0,0 +1,204 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from logic.mlp_engine import (
+    MAPPED_META, NPZ_FILE, NumpyMLP, PassthroughScaler, mapped_dir_name, read_mapped_meta,
+)
+from logic.uploads import sha256_file
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / "minimal_AI_model" / "models"
+
+MODEL_FILE = "mlp.joblib"
+SCALER_FILE = "scaler.joblib"
+CLASS_NAMES_FILE = "class_names.npy"
+
+
+class ModelSession:
+    """
+    Process-wide holder for the MLP, its scaler and the class names.
+
+    Artifacts are loaded lazily on first use and kept warm afterwards. Every
+    access compares the (mtime, size) signature of the files on disk with the
+    one captured at load time and transparently reloads when they differ, so
+    dropping a retrained model into `models/` takes effect without a restart.
+
+    With `engine="auto"` an exported `mlp.npz` (see `logic.mlp_engine`) is
+    served by the NumPy engine as long as it is not older than `mlp.joblib`;
+    otherwise the sklearn pickles are used. `engine="mapped"` serves the
+    memory-mapped `mlp_<variant>/` directory (float32 by default, which is
+    used in place; float16 and int8 are upcast once into a private float32
+    copy, see `logic.mlp_engine`).
+    """
+
+    def __init__(self, models_dir: Optional[str] = None, engine: Optional[str] = None,
+                 variant: Optional[str] = None):
+        self.models_dir = Path(models_dir or os.getenv("MODEL_DIR", str(MODELS_DIR)))
+        self.engine = engine or os.getenv("MODEL_ENGINE", "auto")
+        self.variant = variant or os.getenv("MODEL_VARIANT", "float32")
+        if self.engine not in ("auto", "numpy", "sklearn", "mapped"):
+            raise ValueError(f"Unknown model engine: {self.engine}")
+        self.engine_name: Optional[str] = None
+        self._lock = threading.RLock()
+        self._model = None
+        self._scaler = None
+        self._class_names: List[str] = []
+        self._signature = None
+        self.version: Optional[str] = None
+        self.fingerprint: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.load_count = 0
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+
+    @property
+    def model(self):
+        self.ensure_loaded()
+        return self._model
+
+    @property
+    def scaler(self):
+        self.ensure_loaded()
+        return self._scaler
+
+    @property
+    def class_names(self) -> List[str]:
+        self.ensure_loaded()
+        return self._class_names
+
+    def ensure_loaded(self) -> "ModelSession":
+        """
+        Load the artifacts if they were never loaded or changed on disk.
+        """
+        signature = self._read_signature()
+        if signature == self._signature and self._model is not None:
+            return self
+        with self._lock:
+            signature = self._read_signature()
+            if signature != self._signature or self._model is None:
+                self._load(signature)
+        return self
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Describe what is currently being served (for logs and the UI).
+        """
+        return {
+            "models_dir": str(self.models_dir),
+            "engine": self.engine_name,
+            "variant": self.variant if self.engine_name == "mapped" else None,
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "load_count": self.load_count,
+            "class_names": list(self._class_names),
+        }
+
+    # -------------------------------------------------------------------------
+    # Internal helpers
+    # -------------------------------------------------------------------------
+
+    def _resolve_engine(self) -> str:
+        if self.engine != "auto":
+            return self.engine
+        npz = self.models_dir / NPZ_FILE
+        joblib_path = self.models_dir / MODEL_FILE
+        if not npz.exists():
+            return "sklearn"
+        if joblib_path.exists() and joblib_path.stat().st_mtime_ns > npz.stat().st_mtime_ns:
+            return "sklearn"  # stale export; serve the newer pickle
+        return "numpy"
+
+    def _paths(self, engine: Optional[str] = None) -> List[Path]:
+        engine = engine or self._resolve_engine()
+        if engine == "mapped":
+            mapped = self.models_dir / mapped_dir_name(self.variant)
+            return [mapped / MAPPED_META] + sorted(mapped.glob("*.npy"))
+        if engine == "numpy":
+            return [self.models_dir / NPZ_FILE, self.models_dir / CLASS_NAMES_FILE]
+        return [self.models_dir / MODEL_FILE, self.models_dir / SCALER_FILE, self.models_dir / CLASS_NAMES_FILE]
+
+    def _read_signature(self):
+        engine = self._resolve_engine()
+        sig = [engine]
+        for p in self._paths(engine):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                raise RuntimeError(f"Missing model artifact: {p}")
+            sig.append((p.name, st.st_mtime_ns, st.st_size))
+        return tuple(sig)
+
+    def _content_fingerprint(self, engine: str) -> str:
+        """
+        sha256 over the artifact bytes, so identical models share a fingerprint
+        regardless of where or when they were copied. Mapped artifacts carry
+        their digest in meta.json, which keeps their startup near zero.
+        """
+        if engine == "mapped":
+            meta = read_mapped_meta(str(self.models_dir / mapped_dir_name(self.variant)))
+            return hashlib.sha256(f"mapped:{meta['content_sha256']}".encode("utf-8")).hexdigest()
+        h = hashlib.sha256()
+        for p in self._paths(engine):
+            h.update(p.name.encode("utf-8"))
+            h.update(sha256_file(str(p)).encode("ascii"))
+        return h.hexdigest()
+
+    def _load(self, signature) -> None:
+        t0 = time.perf_counter()
+        engine = signature[0]
+        names_path = self.models_dir / CLASS_NAMES_FILE
+        if engine == "mapped":
+            model = NumpyMLP.load_mapped(str(self.models_dir / mapped_dir_name(self.variant)))
+            scaler = PassthroughScaler()
+        elif engine == "numpy":
+            npz_path, names_path = self._paths(engine)
+            model = NumpyMLP.load(str(npz_path))
+            scaler = PassthroughScaler()
+        else:
+            import joblib  # pulls in sklearn when unpickling; only needed for this engine
+
+            model_path, scaler_path, names_path = self._paths(engine)
+            model = joblib.load(str(model_path))
+            scaler = joblib.load(str(scaler_path))
+        if engine == "mapped" and model.class_names:
+            class_names = list(model.class_names)
+        else:
+            class_names = np.load(str(names_path), allow_pickle=True).tolist()
+
+        self._model = model
+        self._scaler = scaler
+        self._class_names = class_names
+        self._signature = signature
+        self.engine_name = engine
+        self.fingerprint = self._content_fingerprint(engine)
+        self.version = self.fingerprint[:12]
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - t0
+        self.load_count += 1
+        print(f"[ModelSession] Loaded {engine} model {self.version} in {self.load_seconds * 1000:.1f} ms")
+
+
+_session: Optional[ModelSession] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> ModelSession:
+    """
+    Return the shared ModelSession, creating it on first call.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = ModelSession()
+    return _session
@@ -1,15 +1,26 @@
 import os
+import shutil
+from collections import Counter
 import io
+import re
 import hashlib
+import threading
 import urllib.request
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
 from PIL import Image
-from pymongo import MongoClient
+from pymongo import ASCENDING, IndexModel, MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from bson import ObjectId
 import gridfs
 import time
 
 from model.models import Case
+from logic.downloads import DownloadManager, FileProgress
+from logic.blob_store import BlobStore
+from logic.image_cache import ImageCache
+from logic.pyramid import PyramidCache
+from logic.uploads import UploadManager, sha256_file, stream_from_file
 
 try:
     from dotenv import load_dotenv
@@ -18,21 +29,107 @@ except Exception:
     pass
 
 
+def client_options_from_env() -> Dict[str, Any]:
+    """
+    MongoClient keyword arguments from MONGO_* environment variables.
+
+    Options left unset fall back to the driver defaults (or to whatever the
+    connection string specifies).
+    """
+    opts: Dict[str, Any] = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "20")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "appname": os.getenv("MONGO_APP_NAME", "LungCancerTool"),
+    }
+    if os.getenv("MONGO_SOCKET_TIMEOUT_MS"):
+        opts["socketTimeoutMS"] = int(os.environ["MONGO_SOCKET_TIMEOUT_MS"])
+    if os.getenv("MONGO_COMPRESSORS"):
+        opts["compressors"] = os.environ["MONGO_COMPRESSORS"]  # e.g. "zstd,snappy,zlib"
+    return opts
+
+
 def _is_url(s: str) -> bool:
     return s.startswith("http://") or s.startswith("https://")
 
 
-def _sha1(s: str) -> str:
-    return hashlib.sha1(s.encode("utf-8")).hexdigest()
+CASE_LIST_PROJECTION = {
+    "case_id": 1,
+    "patient_name": 1,
+    "date": 1,
+    "segmentation_status": 1,
+    "ct_images": 1,
+    "updated_at": 1,
+}
+
+# delta sync looks back this far past its watermark, since workstation clocks drift
+SYNC_OVERLAP = timedelta(seconds=30)
+# how long deleted case_ids are remembered for other workstations to pick up
+TOMBSTONE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+
+# sortable columns of the cases table -> document field
+SORT_FIELDS = {
+    "case_id": "case_id",
+    "patient_name": "patient_name",
+    "date": "date",
+    "segmentation_status": "segmentation_status",
+}
+
+_TOKEN_SPLIT = re.compile(r"[\s\-_,.;/]+")
+
+
+def search_terms(case_id: str, patient_name: str) -> List[str]:
+    """
+    Lowercase prefix-searchable terms for a case: the full id and name plus their words.
+    """
+    terms = set()
+    for value in (case_id or "", patient_name or ""):
+        value = value.lower().strip()
+        if value:
+            terms.add(value)
+            terms.update(t for t in _TOKEN_SPLIT.split(value) if t)
+    return sorted(terms)
+
+
+def matches_query(case_id: str, patient_name: str, query: str) -> bool:
+    """
+    Client-side twin of the `search_cases` filter, for patching a loaded page.
+    """
+    terms = search_terms(case_id, patient_name)
+    return all(
+        any(t.startswith(tok) for t in terms)
+        for tok in _TOKEN_SPLIT.split((query or "").lower().strip()) if tok
+    )
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(dt: datetime) -> datetime:
+    # pymongo hands back naive datetimes (UTC) unless the client is tz_aware
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
 
 
 class MongoDB:
+    """
+    Case storage on MongoDB + GridFS, with a local image cache.
+
+    The client is created on first use, not in the constructor, so building
+    one (e.g. before the first window is shown) never blocks on the network.
+    `client_options` are passed to MongoClient on top of the MONGO_* settings
+    read by `client_options_from_env`.
+    """
+
     def __init__(
         self,
         mongo_uri: Optional[str] = None,
         db_name: Optional[str] = None,
         cases_collection: Optional[str] = None,
         cache_dir: Optional[str] = None,
+        client_options: Optional[Dict[str, Any]] = None,
     ):
         self.mongo_uri = mongo_uri or os.getenv("MONGO_URI")
         self.db_name = db_name or os.getenv("MONGO_DB_NAME", "lung_cancer_tool")
@@ -44,54 +141,120 @@ class MongoDB:
 
         os.makedirs(self.cache_dir, exist_ok=True)
 
-        self.client = MongoClient(self.mongo_uri)
-        self.db = self.client[self.db_name]
-        self.cases = self.db[self.cases_collection]
-        self.fs = gridfs.GridFS(self.db)
+        self.client_options = dict(client_options_from_env(), **(client_options or {}))
+        self._handles: Optional[Dict[str, Any]] = None
+        self._connect_lock = threading.RLock()
+        self.downloads = DownloadManager(max_workers=int(os.getenv("MONGO_DOWNLOAD_WORKERS", "4")))
+        self.uploads = UploadManager(max_workers=int(os.getenv("MONGO_UPLOAD_WORKERS", "4")))
+        self.image_cache = ImageCache(
+            os.path.join(self.cache_dir, "objects"),
+            max_bytes=int(os.getenv("MONGO_CACHE_MAX_BYTES", str(2 * 1024 ** 3))),
+        )
+        self.pyramids = PyramidCache(os.path.join(self.cache_dir, "pyramids"), index=self.image_cache)
+
+    # -------------------------------------------------------------------------
+    # CONNECTION
+    # -------------------------------------------------------------------------
+
+    @property
+    def client(self) -> MongoClient:
+        return self._connect()["client"]
+
+    @property
+    def db(self):
+        return self._connect()["db"]
+
+    @property
+    def cases(self):
+        return self._connect()["cases"]
+
+    @property
+    def tombstones(self):
+        return self._connect()["tombstones"]
+
+    @property
+    def fs(self) -> gridfs.GridFS:
+        return self._connect()["fs"]
+
+    @property
+    def blobs(self) -> BlobStore:
+        return self._connect()["blobs"]
+
+    @property
+    def connected(self) -> bool:
+        return self._handles is not None
+
+    def connect(self) -> None:
+        """
+        Connect now (index setup and one-time migrations included) instead of on first use.
+        """
+        self._connect()
+
+    def close(self) -> None:
+        with self._connect_lock:
+            if self._handles is not None:
+                self._handles["client"].close()
+                self._handles = None
+        self.downloads.shutdown()
+        self.uploads.shutdown()
+
+    def _connect(self) -> Dict[str, Any]:
+        handles = self._handles
+        if handles is not None:
+            return handles
+        with self._connect_lock:
+            if self._handles is None:
+                client = MongoClient(self.mongo_uri, **self.client_options)
+                db = client[self.db_name]
+                cases = db[self.cases_collection]
+                fs = gridfs.GridFS(db)
+                handles = {
+                    "client": client,
+                    "db": db,
+                    "cases": cases,
+                    "tombstones": db[f"{self.cases_collection}_deleted"],
+                    "fs": fs,
+                    "blobs": BlobStore(db["blobs"], fs, db["fs.files"], cases),
+                }
+                # published only once set up, so the lock-free fast path and
+                # `connected` never hand out a half-initialized database
+                try:
+                    self._ensure_indexes(handles)
+                except Exception:
+                    client.close()  # retry on next use
+                    raise
+                self._handles = handles
+                print(f"[MongoDB] Connected to {self.db_name} (pool {self.client_options.get('maxPoolSize')})")
+            return self._handles
 
     # -------------------------------------------------------------------------
     # CRUD OPERATIONS
     # -------------------------------------------------------------------------
 
-    def insert_case(self, case: Case) -> Optional[str]:
+    def insert_case(self, case: Case, progress: Optional[FileProgress] = None) -> Optional[Case]:
         """
         Insert a new Case into MongoDB, storing images in GridFS.
 
-        - Local files are uploaded to GridFS
+        - Local files are uploaded to GridFS in parallel, skipping any whose
+          content is already stored (matched by sha256)
         - Existing GridFS ObjectId refs are preserved
-        - No dependency on permanent local storage
-        """
+        - Every image holds a reference in the blob store
+        - The case document is written only after every upload succeeded;
+          on failure the references are dropped and new files deleted again
 
-        # 1. Prevent duplicate case_id
-        existing = self.cases.find_one({"case_id": case.case_id})
-        if existing:
+        Returns the case as stored (GridFS refs, names and sizes), or None if
+        the case_id is already taken.
+        """
+        if any(os.path.exists(ref) for ref in case.ct_images if ref) and \
+                self.cases.count_documents({"case_id": case.case_id}, limit=1):
+            # fail before a long upload; the unique index below remains the real guard
             print(f"[MongoDB] Case with id {case.case_id} already exists, skipping insert.")
             return None
 
-        file_ids: List[str] = []
+        # 1. Upload local files and take a blob reference for every image
+        file_ids, _ = self._refs_for_images(case.ct_images, progress=progress)
 
-        # 2. Process images safely
-        for img_ref in case.ct_images:
-            if not img_ref:
-                continue
-
-            # Case A: already a GridFS ObjectId (string)
-            if not os.path.exists(img_ref):
-                file_ids.append(img_ref)
-                continue
-
-            # Case B: local file → upload to GridFS
-            try:
-                with open(img_ref, "rb") as f:
-                    file_id = self.fs.put(
-                        f,
-                        filename=os.path.basename(img_ref)
-                    )
-                file_ids.append(str(file_id))
-            except Exception as e:
-                raise RuntimeError(f"Failed to upload image '{img_ref}' to GridFS: {e}")
-
-        # 3. Insert case document
+        # 2. Insert case document; the unique case_id index rejects duplicates
         doc = {
             "case_id": case.case_id,
             "patient_name": case.patient_name,
@@ -99,60 +262,165 @@ class MongoDB:
             "segmentation_status": case.segmentation_status,
             "ct_images": file_ids,  # GridFS ObjectId strings
             "ai_result": {},  # empty at first
+            "search_terms": search_terms(case.case_id, case.patient_name),
+            "updated_at": _now(),
         }
 
-        result = self.cases.insert_one(doc)
+        try:
+            result = self.cases.insert_one(doc)
+        except DuplicateKeyError:
+            self._release(file_ids, reclaim=True)
+            print(f"[MongoDB] Case with id {case.case_id} already exists, skipping insert.")
+            return None
+        except BaseException:
+            self._release(file_ids, reclaim=True)
+            raise
         print(f"[MongoDB] Inserted case {case.case_id} with _id={result.inserted_id}")
+        self.tombstones.delete_many({"case_id": case.case_id})  # the id is live again
 
-        return str(result.inserted_id)
+        return self._case_from_doc(doc, self._file_info(file_ids))
 
-    def update_case(self, case: Case) -> bool:
-        doc = self._find_case_doc(case.case_id)
-        existing_refs = set(doc.get("ct_images", []))
+    def update_case(self, case: Case, progress: Optional[FileProgress] = None) -> Case:
+        """
+        Update a case's fields and images; returns the case as stored.
 
-        new_refs = []
+        The new image list is compared with the stored refs: cached copies of
+        GridFS files map back to their refs, only local files with new content
+        are uploaded, and the references of dropped images are released; a
+        file no other case references is deleted right away.
 
-        for img in case.ct_images:
-            if os.path.exists(img):
-                with open(img, "rb") as f:
-                    fid = self.fs.put(f, filename=os.path.basename(img))
-                    new_refs.append(str(fid))
-            else:
-                new_refs.append(img)  # deja GridFS
-
-        result = self.cases.update_one(
-            {"case_id": case.case_id},
-            {
-                "$set": {
-                    "patient_name": case.patient_name,
-                    "date": case.date,
-                    "segmentation_status": case.segmentation_status,
-                    "ct_images": new_refs,
-                }
-            },
-        )
-        return result.matched_count > 0
+        Raises KeyError if no case has this case_id.
+        """
+        new_refs, sent = self._refs_for_images(case.ct_images, progress)
+        fields = {
+            "patient_name": case.patient_name,
+            "date": case.date,
+            "segmentation_status": case.segmentation_status,
+            "ct_images": new_refs,
+            "search_terms": search_terms(case.case_id, case.patient_name),
+            "updated_at": _now(),
+        }
+        try:
+            before = self.cases.find_one_and_update(
+                {"case_id": case.case_id},
+                {"$set": fields},
+                projection=CASE_LIST_PROJECTION,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except BaseException:
+            self._release(new_refs, reclaim=True)
+            raise
+        if before is None:
+            self._release(new_refs, reclaim=True)
+            raise KeyError(f"Case '{case.case_id}' not found in MongoDB collection '{self.cases_collection}'.")
+
+        freed_count, freed_bytes = self._release(before.get("ct_images", []) or [], reclaim=True)
+        print(f"[MongoDB] Updated case {case.case_id}: uploaded {sent / 1e6:.1f} MB, "
+              f"freed {freed_count} file(s) ({freed_bytes / 1e6:.1f} MB)")
+        return self._case_from_doc(dict(before, **fields), self._file_info(new_refs))
 
     def list_cases(self) -> List[Case]:
-        out = []
-        for doc in self.cases.find({}):
-            ct_refs = doc.get("ct_images", []) or []
-
-            resolved = [
-                self._resolve_image_to_local_path(ref, subdir="ct")
-                for ref in ct_refs
-            ]
-
-            out.append(
-                Case(
-                    case_id=str(doc.get("case_id")),
-                    patient_name=doc.get("patient_name", ""),
-                    date=doc.get("date", ""),
-                    segmentation_status=doc.get("segmentation_status", ""),
-                    ct_images=resolved,
-                )
-            )
-        return out
+        """
+        List case metadata without downloading any image.
+
+        `ct_images` holds the stored refs; filenames and sizes come from one
+        `fs.files` query for the whole listing. Use `resolve_images` to
+        materialize a case's files when it is actually opened.
+        """
+        docs = list(self.cases.find({}, CASE_LIST_PROJECTION))
+        files = self._file_info([ref for doc in docs for ref in doc.get("ct_images", []) or []])
+        return [self._case_from_doc(doc, files) for doc in docs]
+
+    def search_cases(
+        self,
+        query: str = "",
+        sort: str = "case_id",
+        descending: bool = False,
+        page_size: int = 100,
+        after: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[Case], Optional[Dict[str, Any]]]:
+        """
+        Return one page of cases matching `query`, plus the cursor for the next page.
+
+        Every word of the query must prefix-match a word of the case id or
+        patient name (indexed `search_terms`). Paging is keyset-based on
+        (sort field, _id), so page N costs the same as page 1. The returned
+        cursor is None on the last page.
+        """
+        field = SORT_FIELDS.get(sort)
+        if field is None:
+            raise ValueError(f"Cannot sort cases by '{sort}'")
+
+        clauses: List[Dict[str, Any]] = [
+            {"search_terms": {"$regex": "^" + re.escape(tok)}}
+            for tok in _TOKEN_SPLIT.split((query or "").lower().strip()) if tok
+        ]
+        if after is not None:
+            op = "$lt" if descending else "$gt"
+            clauses.append({"$or": [
+                {field: {op: after["value"]}},
+                {field: after["value"], "_id": {op: after["id"]}},
+            ]})
+        filt = {"$and": clauses} if clauses else {}
+
+        direction = -1 if descending else 1
+        docs = list(
+            self.cases.find(filt, CASE_LIST_PROJECTION)
+            .sort([(field, direction), ("_id", direction)])
+            .limit(page_size + 1)
+        )
+        more = len(docs) > page_size
+        docs = docs[:page_size]
+        files = self._file_info([ref for doc in docs for ref in doc.get("ct_images", []) or []])
+        cursor = {"value": docs[-1].get(field), "id": docs[-1]["_id"]} if more else None
+        return [self._case_from_doc(doc, files) for doc in docs], cursor
+
+    def changes_since(self, since: datetime) -> Tuple[List[Case], List[str], datetime]:
+        """
+        Cases written and case_ids deleted (by any workstation) after `since`.
+
+        Returns (changed, deleted_ids, watermark); pass the watermark back on
+        the next call. The window overlaps the previous one by SYNC_OVERLAP,
+        so a change may be reported twice but not missed because of clock
+        drift; applying one is idempotent.
+        """
+        watermark = _as_utc(since)
+        start = watermark - SYNC_OVERLAP
+        docs = list(self.cases.find({"updated_at": {"$gt": start}}, CASE_LIST_PROJECTION))
+        files = self._file_info([ref for doc in docs for ref in doc.get("ct_images", []) or []])
+        changed = [self._case_from_doc(doc, files) for doc in docs]
+        deleted = []
+        for t in self.tombstones.find({"deleted_at": {"$gt": start}}, {"case_id": 1, "deleted_at": 1}):
+            deleted.append(t["case_id"])
+            watermark = max(watermark, _as_utc(t["deleted_at"]))
+        for doc in docs:
+            watermark = max(watermark, _as_utc(doc["updated_at"]))
+        return changed, deleted, watermark
+
+    def next_case_number(self, prefix: str = "LC-") -> int:
+        """
+        Highest numeric suffix among case_ids of the form `<prefix><digits>`
+        ("LC-042" -> 42); 0 when there are none. The maximum is taken on the
+        server over the numbers, not the strings, so LC-1000 outranks LC-999.
+        """
+        rows = list(self.cases.aggregate([
+            {"$match": {"case_id": {"$regex": f"^{re.escape(prefix)}[0-9]+$"}}},
+            {"$group": {"_id": None, "n": {"$max": {"$toLong": {"$substrBytes": ["$case_id", len(prefix), 32]}}}}},
+        ]))
+        return int(rows[0]["n"]) if rows and rows[0].get("n") is not None else 0
+
+    def resolve_images(self, refs: List[str], progress: Optional[FileProgress] = None) -> List[str]:
+        """
+        Return local paths for image refs, downloading from GridFS into the cache as needed.
+
+        Missing files are fetched in parallel; `progress(ref, done, total)` is
+        called from the download threads as bytes arrive.
+        """
+        return self.downloads.fetch_all(
+            [ref for ref in refs if ref],
+            lambda ref, cb: self._resolve_image_to_local_path(ref, subdir="ct", progress=cb),
+            progress,
+        )
 
     def get_ai_result(self, case_id: str) -> Dict[str, Any]:
         doc = self._find_case_doc(case_id)
@@ -163,54 +431,284 @@ class MongoDB:
         heatmap_img = None
         if heatmap_ref:
             heatmap_img = self._load_image_as_pil(heatmap_ref).convert("RGBA")
-        return {"biomarkers": biomarkers, "explanation": explanation, "heatmap": heatmap_img}
+        return {
+            "biomarkers": biomarkers,
+            "explanation": explanation,
+            "heatmap": heatmap_img,
+            "slices": ai.get("slices", []) or [],
+            "aggregate": ai.get("aggregate") or {},
+            "model_version": ai.get("model_version"),
+            "model_fingerprint": ai.get("model_fingerprint"),
+            "input_hash": ai.get("input_hash"),
+        }
+
+    def save_ai_result(self, case_id: str, ai_result: Dict[str, Any]) -> bool:
+        """
+        Persist model output into the case's `ai_result` sub-document.
+
+        Fields are set individually so an existing `heatmap` ref survives.
+        """
+        fields = {f"ai_result.{k}": v for k, v in ai_result.items()}
+        result = self.cases.update_one({"case_id": case_id}, {"$set": fields})
+        return result.matched_count > 0
 
     # -------------------------------------------------------------------------
     # Internal helpers
     # -------------------------------------------------------------------------
 
+    def _file_info(self, refs: List[str]) -> Dict[str, Dict[str, Any]]:
+        oids = []
+        for ref in refs:
+            try:
+                oids.append(ObjectId(ref))
+            except Exception:
+                continue  # local path or URL
+        if not oids:
+            return {}
+        cursor = self.db["fs.files"].find({"_id": {"$in": oids}}, {"filename": 1, "length": 1})
+        return {str(f["_id"]): f for f in cursor}
+
+    def _case_from_doc(self, doc: Dict[str, Any], files: Dict[str, Dict[str, Any]]) -> Case:
+        refs = doc.get("ct_images", []) or []
+        names, sizes = [], []
+        for ref in refs:
+            info = files.get(ref)
+            if info:
+                names.append(info.get("filename") or ref)
+                sizes.append(int(info.get("length", 0)))
+            else:
+                names.append(os.path.basename(ref))
+                sizes.append(os.path.getsize(ref) if os.path.isfile(ref) else 0)
+        return Case(
+            case_id=str(doc.get("case_id")),
+            patient_name=doc.get("patient_name", ""),
+            date=doc.get("date", ""),
+            segmentation_status=doc.get("segmentation_status", ""),
+            ct_images=list(refs),
+            image_names=names,
+            image_sizes=sizes,
+        )
+
+    def _ensure_indexes(self, handles: Dict[str, Any]) -> None:
+        """
+        Create the indexes the lookups rely on (no-op when they already exist)
+        and apply pending migrations, on the not yet published `handles`.
+
+        A collection that already holds duplicate case_ids cannot get the
+        unique index; that is reported and lookups fall back to a plain one.
+        """
+        secondary = [
+            IndexModel([("date", ASCENDING), ("_id", ASCENDING)], name="date_id"),
+            IndexModel([("segmentation_status", ASCENDING), ("_id", ASCENDING)], name="status_id"),
+            IndexModel([("patient_name", ASCENDING), ("_id", ASCENDING)], name="patient_name_id"),
+            IndexModel([("search_terms", ASCENDING)], name="search_terms"),
+            IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+        ]
+        cases = handles["cases"]
+        try:
+            cases.create_indexes(
+                [IndexModel([("case_id", ASCENDING)], name="case_id_unique", unique=True)] + secondary
+            )
+        except (DuplicateKeyError, OperationFailure) as e:
+            print(f"[MongoDB] Could not create unique case_id index ({e}); fix duplicate case_ids.")
+            cases.create_indexes([IndexModel([("case_id", ASCENDING)], name="case_id")] + secondary)
+        handles["tombstones"].create_indexes([
+            IndexModel([("deleted_at", ASCENDING)], name="deleted_at_ttl", expireAfterSeconds=TOMBSTONE_TTL_SECONDS),
+        ])
+        self._migrate_once(handles["db"], "search_terms_backfill", lambda: self._backfill_search_terms(cases))
+        handles["blobs"].ensure_indexes()
+
+    @staticmethod
+    def _migrate_once(db, name: str, fn) -> None:
+        """
+        Run a data migration unless the `migrations` collection records it as done.
+        """
+        migrations = db["migrations"]
+        if migrations.find_one({"_id": name}, {"_id": 1}) is not None:
+            return
+        fn()
+        migrations.update_one({"_id": name}, {"$set": {"done_at": _now()}}, upsert=True)
+        print(f"[MongoDB] Applied migration {name}")
+
+    @staticmethod
+    def _backfill_search_terms(cases) -> None:
+        """
+        Add `search_terms` to cases written before search existed (run once, see `_migrate_once`).
+        """
+        ops = []
+        for doc in cases.find({"search_terms": {"$exists": False}}, {"case_id": 1, "patient_name": 1}):
+            terms = search_terms(str(doc.get("case_id", "")), doc.get("patient_name", ""))
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"search_terms": terms}}))
+            if len(ops) >= 500:
+                cases.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            cases.bulk_write(ops, ordered=False)
+
     def _find_case_doc(self, case_id: str) -> Dict[str, Any]:
-        doc = self.cases.find_one({"case_id": case_id})
-        if doc:
-            return doc
-        doc = self.cases.find_one({"_id": case_id})
-        if doc:
-            return doc
+        """
+        Find a case by case_id, string _id or ObjectId _id in one round trip,
+        preferring a case_id match when several documents qualify.
+        """
+        clauses: List[Dict[str, Any]] = [{"case_id": case_id}, {"_id": case_id}]
         try:
-            oid = ObjectId(case_id)
-            doc = self.cases.find_one({"_id": oid})
-            if doc:
-                return doc
+            clauses.append({"_id": ObjectId(case_id)})
         except Exception:
             pass
+        docs = list(self.cases.find({"$or": clauses}).limit(len(clauses)))
+        for doc in docs:
+            if doc.get("case_id") == case_id:
+                return doc
+        if docs:
+            return docs[0]
         raise KeyError(f"Case '{case_id}' not found in MongoDB collection '{self.cases_collection}'.")
 
-    def _resolve_image_to_local_path(self, ref: str, subdir: str) -> str:
+    def _refs_for_images(self, images: List[str], progress: Optional[FileProgress] = None
+                         ) -> Tuple[List[str], int]:
+        """
+        Turn an edited image list into GridFS refs, holding one blob
+        reference per entry: refs pass through, cached copies map back to
+        the ref they were downloaded from, and other local files are
+        uploaded (deduplicated). Returns (refs, bytes uploaded).
+        """
+        refs: List[Optional[str]] = []
+        local: List[str] = []
+        for img in images:
+            if not img:
+                continue
+            key = self.image_cache.key_for_path(img) if os.path.exists(img) else None
+            if key is not None and ObjectId.is_valid(key):
+                refs.append(key)
+            elif os.path.exists(img):
+                refs.append(None)
+                local.append(img)
+            else:
+                refs.append(img)
+        existing = [ref for ref in refs if ref is not None]
+        self.blobs.add_refs(existing)
+        try:
+            uploaded, sent = self._upload_files(local, progress=progress)
+        except BaseException:
+            self._release(existing)
+            raise
+        it = iter(uploaded)
+        return [ref if ref is not None else next(it) for ref in refs], sent
+
+    def _upload_files(self, paths: List[str], progress: Optional[FileProgress] = None
+                      ) -> Tuple[List[str], int]:
+        """
+        Store local files in GridFS, deduplicated by content, holding one
+        blob reference per path.
+
+        Files are hashed in parallel; digests the blob store already has are
+        acquired, and the rest are streamed concurrently and registered.
+        Returns (refs parallel to `paths`, bytes uploaded). If anything
+        fails, the references taken so far are released again (see
+        `_release`) and the error is re-raised.
+        """
+        if not paths:
+            return [], 0
+        digests = self.uploads.map(sha256_file, paths)
+        counts = Counter(digests)
+        first_path = {}
+        for path, digest in zip(paths, digests):
+            first_path.setdefault(digest, path)
+
+        stored: Dict[str, str] = {}
+        held: List[str] = []  # one entry per reference taken
+        lock = threading.Lock()
+
+        def put(digest):
+            fid = self._put_file(first_path[digest], digest, progress)
+            try:
+                ref = self.blobs.register(fid, digest, os.path.getsize(first_path[digest]), counts[digest])
+            except BaseException:
+                self._delete_files([fid])
+                raise
+            with lock:
+                held.extend([ref] * counts[digest])
+            return digest, ref
+
+        try:
+            for digest, n in counts.items():
+                ref = self.blobs.acquire(digest, n)
+                if ref is not None:
+                    stored[digest] = ref
+                    held.extend([ref] * n)
+            todo = [d for d in counts if d not in stored]
+            stored.update(self.uploads.map(put, todo))
+        except BaseException:
+            self._release(held, reclaim=True)  # includes cancellation raised by `progress`
+            raise
+        sent = sum(os.path.getsize(first_path[d]) for d in todo)
+        print(f"[MongoDB] Uploaded {len(todo)} image(s) ({sent / 1e6:.1f} MB), "
+              f"deduplicated {len(paths) - len(todo)} by content")
+        return [stored[d] for d in digests], sent
+
+    def _put_file(self, path: str, digest: str, progress: Optional[FileProgress]) -> ObjectId:
+        """
+        Stream one local file into GridFS, verifying it still has the expected digest.
+        """
+        hasher = hashlib.sha256()
+        grid_in = self.fs.new_file(filename=os.path.basename(path), metadata={"sha256": digest})
+        try:
+            stream_from_file(path, grid_in, os.path.getsize(path), ref=path, progress=progress, hasher=hasher)
+            grid_in.close()
+        except BaseException:
+            grid_in.abort()
+            raise
+        if hasher.hexdigest() != digest:
+            self._delete_files([grid_in._id])
+            raise RuntimeError(f"Image '{path}' changed while it was being uploaded")
+        return grid_in._id
+
+    def _release(self, refs: List[str], reclaim: bool = False) -> Tuple[int, int]:
+        """
+        Drop one blob reference per entry of `refs`. With `reclaim`, blobs
+        that end up unreferenced are deleted right away instead of waiting
+        for compaction. Returns (files deleted, bytes freed).
+        """
+        self.blobs.remove_refs(refs)
+        if not reclaim:
+            return 0, 0
+        return self.blobs.compact(only=refs, grace_seconds=0)
+
+    def _delete_files(self, file_ids: List[ObjectId]) -> None:
+        for fid in file_ids:
+            try:
+                self.fs.delete(fid)
+            except Exception:
+                pass
+
+    def _resolve_image_to_local_path(self, ref: str, subdir: str, progress: Optional[FileProgress] = None) -> str:
+        """
+        Map a ref to a readable local file; GridFS refs go through `image_cache`.
+
+        `subdir` is kept for callers of the old filename-keyed layout; cached
+        files are now keyed by ObjectId, so it no longer affects the path.
+        """
         if not ref:
             return ref
 
         if os.path.exists(ref):
             return ref
 
-        target_dir = os.path.join(self.cache_dir, subdir, "assets")
-        os.makedirs(target_dir, exist_ok=True)
-
         try:
             oid = ObjectId(ref)
-            grid_out = self.fs.get(oid)
         except Exception as e:
             raise RuntimeError(f"Invalid GridFS ref: {ref}") from e
 
-        filename = grid_out.filename or f"{ref}"
-        local_path = os.path.join(target_dir, filename)
-
-        if os.path.exists(local_path):
-            return local_path
+        cached = self.image_cache.get(ref)
+        if cached:
+            return cached
 
-        with open(local_path, "wb") as f:
-            f.write(grid_out.read())
+        try:
+            grid_out = self.fs.get(oid)
+        except Exception as e:
+            raise RuntimeError(f"Invalid GridFS ref: {ref}") from e
 
-        return local_path
+        ext = os.path.splitext(grid_out.filename or "")[1]
+        return self.image_cache.put_stream(ref, grid_out, ext=ext, progress=progress)
 
     def _load_image_as_pil(self, ref: str) -> Image.Image:
         raw = self._load_bytes(ref)
@@ -234,32 +732,79 @@ class MongoDB:
         grid_out = self.fs.get(oid)
         return grid_out.read()
 
-    def delete_case(self, case_id):
-        doc = self.cases.find_one({"case_id": case_id})
+    def delete_case(self, case_id: str) -> bool:
+        doc = self.cases.find_one_and_delete({"case_id": case_id}, projection={"ct_images": 1})
         if not doc:
             return False
-
-        for ref in doc.get("ct_images", []):
-            try:
-                self.fs.delete(ObjectId(ref))
-            except Exception:
-                pass
-
-        self.cases.delete_one({"case_id": case_id})
+        self.tombstones.insert_one({"case_id": case_id, "deleted_at": _now()})
+        # files may be shared with other cases; unreferenced ones go at the next compaction
+        self._release(doc.get("ct_images", []) or [])
         return True
 
+    def compact_blobs(self) -> Tuple[int, int]:
+        """
+        Reclaim GridFS files no case references any more; returns (files, bytes) freed.
+        """
+        count, freed = self.blobs.compact()
+        if count:
+            print(f"[MongoDB] Compacted blob store: deleted {count} unreferenced file(s), {freed / 1e6:.1f} MB")
+        return count, freed
+
     def clean_cache(self, max_age_seconds: int):
         """
-        Delete files older than `max_age_seconds` from the cache directory.
+        Evict cached images idle for longer than `max_age_seconds` (and any
+        excess over the byte budget) via the cache manifest, pyramid levels
+        included, remove cached files the manifest does not list, then drop
+        files left in the legacy filename-keyed `ct/assets` layout.
         """
+        freed = self.image_cache.evict(max_age_seconds=max_age_seconds)
+        if freed:
+            print(f"[MongoDB] Evicted {freed / 1e6:.1f} MB from image cache: {self.image_cache.stats()}")
+        freed = self.image_cache.sweep_orphans(self.pyramids.root)
+        if freed:
+            print(f"[MongoDB] Removed {freed / 1e6:.1f} MB of untracked files from the image cache")
+
+        # viewer frame spill directories left behind by a crash
+        frames_dir = os.path.join(self.cache_dir, "frames")
+        if os.path.isdir(frames_dir):
+            now = time.time()
+            for entry in os.scandir(frames_dir):
+                if entry.is_dir() and now - entry.stat().st_mtime > max_age_seconds:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+        legacy_dir = os.path.join(self.cache_dir, "ct", "assets")
+        if not os.path.isdir(legacy_dir):
+            return
         now = time.time()
-        for root, dirs, files in os.walk(self.cache_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                if os.path.isfile(file_path):
-                    if now - os.path.getatime(file_path) > max_age_seconds:
-                        try:
-                            os.remove(file_path)
-                            print(f"Deleted cached file: {file_path}")
-                        except Exception as e:
-                            print(f"Failed to delete file {file_path}: {e}")
\ No newline at end of file
+        for entry in os.scandir(legacy_dir):
+            if entry.is_file() and now - entry.stat().st_atime > max_age_seconds:
+                try:
+                    os.remove(entry.path)
+                    print(f"Deleted cached file: {entry.path}")
+                except Exception as e:
+                    print(f"Failed to delete file {entry.path}: {e}")
+
+
+_shared: Optional[MongoDB] = None
+_shared_lock = threading.Lock()
+
+
+def get_db() -> MongoDB:
+    """
+    Return the process-wide MongoDB handle, creating it (unconnected) on first call.
+    """
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = MongoDB()
+    return _shared
+
+
+def set_db(db: Optional[MongoDB]) -> None:
+    """
+    Replace the shared handle, e.g. with one pointing at a test database.
+    """
+    global _shared
+    with _shared_lock:
+        _shared = db
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import tempfile
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from bson import ObjectId
+from PIL import Image
+
+from logic.image_cache import ImageCache
+
+# downsampling factors stored next to the full-resolution frames
+PYRAMID_LEVELS = (2, 4, 8)
+
+
+def build_levels(frames: Sequence[np.ndarray], levels: Sequence[int] = PYRAMID_LEVELS) -> Dict[int, np.ndarray]:
+    """
+    Downsample display frames (uint8 gray or RGB, all the same shape) into
+    one stacked array per level.
+
+    Each level is a 2x box reduction of the previous one, so the whole
+    pyramid costs about a third of one pass over the full-resolution pixels.
+    """
+    out: Dict[int, np.ndarray] = {}
+    current = [Image.fromarray(f) for f in frames]
+    factor = 1
+    for level in sorted(levels):
+        while factor < level:
+            current = [img.reduce(2) if min(img.size) >= 2 else img for img in current]
+            factor *= 2
+        out[level] = np.stack([np.asarray(img) for img in current])
+    return out
+
+
+def nearest_level(scale: float, levels: Sequence[int] = PYRAMID_LEVELS) -> int:
+    """
+    The coarsest level that still has at least `scale` x full resolution (1 = full).
+    """
+    best = 1
+    for level in sorted(levels):
+        if level * scale <= 1.0:
+            best = level
+    return best
+
+
+class PyramidCache:
+    """
+    Downsampled copies (1/2, 1/4, 1/8) of every frame of a source image,
+    kept on disk as one .npy stack per (source, level) and memory-mapped on
+    load, so touching a level of a 500-frame series reads only the frames
+    that are drawn.
+
+    Sources are keyed by their GridFS ObjectId when they come from the
+    image cache (file stem), otherwise by path, size and mtime. With an
+    `index`, every level file is registered in that ImageCache: it counts
+    toward the cache's byte budget, is evicted by its LRU, and goes away
+    with the cached image it was built from.
+    """
+
+    def __init__(self, root: str, levels: Sequence[int] = PYRAMID_LEVELS, index: Optional[ImageCache] = None):
+        self.root = root
+        self.levels = tuple(sorted(levels))
+        self.index = index
+        os.makedirs(self.root, exist_ok=True)
+
+    def key_for(self, path: str) -> str:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if ObjectId.is_valid(stem):
+            return stem
+        st = os.stat(path)
+        raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def load(self, path: str) -> Optional[Dict[int, np.ndarray]]:
+        """
+        Memory-mapped levels for `path`, or None if they have not been built.
+        """
+        key = self.key_for(path)
+        out = {}
+        for level in self.levels:
+            try:
+                out[level] = np.load(self._path_for(key, level), mmap_mode="r")
+            except (OSError, ValueError):
+                return None
+        for level in self.levels:
+            self._register(key, level, touch=True)
+        return out
+
+    def save(self, path: str, levels: Dict[int, np.ndarray]) -> None:
+        """
+        Store levels built elsewhere (one stacked array per factor) for `path`.
+        """
+        key = self.key_for(path)
+        for level, stack in levels.items():
+            self._write(self._path_for(key, level), stack)
+            self._register(key, level)
+
+    def _path_for(self, key: str, level: int) -> str:
+        return os.path.join(self.root, key[:2], f"{key}_x{level}.npy")
+
+    def _register(self, key: str, level: int, touch: bool = False) -> None:
+        if self.index is None:
+            return
+        name = f"{key}_x{level}"
+        if touch and self.index.touch(name):
+            return
+        # new, or built before the manifest was (re)created
+        source = key if ObjectId.is_valid(key) else None
+        self.index.add_derived(name, self._path_for(key, level), source_ref=source)
+
+    @staticmethod
+    def _write(path: str, stack: np.ndarray) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".part-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, stack)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
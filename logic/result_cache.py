@@ -0,0 +1,90 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from logic.uploads import sha256_file
+
+
+class ResultCache:
+    """
+    In-process LRU of AI results keyed by (case_id, input content hash, model fingerprint).
+
+    It sits in front of the `ai_result` sub-document in MongoDB: a local hit
+    skips the database entirely, a Mongo hit is promoted into memory, and a
+    miss means the model has to run. The case_id is part of the key because
+    a result carries per-case state (the case's own heatmap, its `ai_result`
+    being written): two cases with the same images are scored separately.
+    File digests come from the image cache when it already knows them, and
+    are otherwise memoised (bounded, LRU) on (path, mtime, size) so repeat
+    requests do not re-read unchanged images.
+    """
+
+    def __init__(self, max_entries: int = 64, max_digests: int = 4096):
+        self.max_entries = max_entries
+        self.max_digests = max_digests
+        self._results: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self._digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def input_hash(self, paths: List[str], known_digest: Optional[Callable[[str], Optional[str]]] = None) -> str:
+        """
+        Order-sensitive digest over the content of every input image.
+
+        `known_digest(path)` may supply a file's sha256 that was already
+        verified elsewhere (the image cache's manifest), which saves reading it.
+        """
+        h = hashlib.sha256()
+        for path in paths:
+            st = os.stat(path)
+            key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+            with self._lock:
+                digest = self._digests.get(key)
+                if digest is not None:
+                    self._digests.move_to_end(key)
+            if digest is None:
+                digest = (known_digest(path) if known_digest else None) or sha256_file(path)
+                with self._lock:
+                    self._digests[key] = digest
+                    while len(self._digests) > self.max_digests:
+                        self._digests.popitem(last=False)
+            h.update(digest.encode("ascii"))
+        return h.hexdigest()
+
+    def get(self, case_id: str, input_hash: str, model_fingerprint: str) -> Optional[Dict[str, Any]]:
+        key = (case_id, input_hash, model_fingerprint)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def put(self, case_id: str, input_hash: str, model_fingerprint: str, result: Dict[str, Any]) -> None:
+        key = (case_id, input_hash, model_fingerprint)
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def record(self, kind: str) -> None:
+        with self._lock:
+            if kind == "hit":
+                self.hits += 1
+            elif kind == "db_hit":
+                self.db_hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "entries": len(self._results),
+            }
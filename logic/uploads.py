@@ -0,0 +1,68 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, List, Optional, Sequence
+
+from logic.downloads import FileProgress
+
+CHUNK_SIZE = 1 << 20
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def stream_from_file(local_path: str, grid_in, total: int, ref: str = "",
+                     progress: Optional[FileProgress] = None, hasher=None) -> int:
+    """
+    Copy a local file into an open GridIn chunk by chunk (feeding `hasher` on the way).
+
+    Memory use is bounded by CHUNK_SIZE whatever the file size; the caller
+    closes (commits) or aborts the GridIn. Returns the number of bytes sent.
+    """
+    done = 0
+    if progress:
+        progress(ref, 0, total)
+    with open(local_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            grid_in.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            done += len(chunk)
+            if progress:
+                progress(ref, done, total)
+    return done
+
+
+class UploadManager:
+    """
+    Bounded thread pool for the upload side of GridFS: hashing and streaming
+    several local files at once.
+
+    `map` keeps the order of its inputs. If any item fails (including a
+    progress callback raising to cancel), items not yet started are dropped
+    and the call waits for the running ones to settle before re-raising, so
+    the caller can roll back everything that was written.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gridfs-upload")
+
+    def map(self, fn: Callable[[Any], Any], items: Sequence[Any]) -> List[Any]:
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        futures = [self._pool.submit(fn, item) for item in items]
+        try:
+            return [f.result() for f in futures]
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            wait(futures)
+            raise
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List
 
 
@@ -8,4 +8,6 @@ class Case:
     patient_name: str
     date: str
     segmentation_status: str
-    ct_images: List[str]  # local file paths (cached) that your UI can open
+    ct_images: List[str]  # GridFS ObjectId strings or local file paths; resolve before opening
+    image_names: List[str] = field(default_factory=list)  # original filenames, parallel to ct_images
+    image_sizes: List[int] = field(default_factory=list)  # bytes per image, parallel to ct_images
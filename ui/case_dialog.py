@@ -86,7 +86,8 @@ class CaseDialog(tk.Toplevel):
         # Case ID
         ttk.Label(form, text="Case ID", style="DialogLabel.TLabel").grid(row=0, column=0, sticky="w", pady=(2, 2))
         self.id_var = tk.StringVar(value=(case.case_id if case else (default_id or "")))
-        id_entry = ttk.Entry(form, textvariable=self.id_var)
+        # the ID is how an edit finds the stored case, so it cannot change here
+        id_entry = ttk.Entry(form, textvariable=self.id_var, state="readonly" if case else "normal")
         id_entry.grid(row=1, column=0, sticky="ew")
         form.grid_columnconfigure(0, weight=1)
 
@@ -113,6 +114,13 @@ class CaseDialog(tk.Toplevel):
         form.grid_rowconfigure(9, weight=1)
 
         self.image_paths = list(case.ct_images) if case else []
+        # stored refs are GridFS ids; remember their display name and size
+        self._ref_info = {}
+        if case:
+            for i, ref in enumerate(case.ct_images):
+                name = case.image_names[i] if i < len(case.image_names) else os.path.basename(ref)
+                size = case.image_sizes[i] if i < len(case.image_sizes) else 0
+                self._ref_info[ref] = (name, size)
 
         # Use tk.Listbox but style colors to match
         self.lb = tk.Listbox(list_row, height=6, activestyle="none",
@@ -120,7 +128,7 @@ class CaseDialog(tk.Toplevel):
                              selectbackground="#1f2937", selectforeground=FG)
         self.lb.pack(side="left", fill="both", expand=True)
         for p in self.image_paths:
-            self.lb.insert("end", os.path.basename(p))
+            self.lb.insert("end", self._ref_info.get(p, (os.path.basename(p), 0))[0])
 
         sb = ttk.Scrollbar(list_row, orient="vertical", command=self.lb.yview)
         sb.pack(side="left", fill="y")
@@ -193,7 +201,16 @@ class CaseDialog(tk.Toplevel):
             messagebox.showerror("Validation", "Date must be YYYY-MM-DD.")
             return
 
-        self.result = Case(cid, name, d, self.status_var.get(), self.image_paths)
+        names, sizes = [], []
+        for p in self.image_paths:
+            if p in self._ref_info:
+                n, size = self._ref_info[p]
+            else:
+                n, size = os.path.basename(p), (os.path.getsize(p) if os.path.isfile(p) else 0)
+            names.append(n)
+            sizes.append(size)
+        self.result = Case(cid, name, d, self.status_var.get(), self.image_paths,
+                           image_names=names, image_sizes=sizes)
         self.destroy()
 
     def _is_dicom(self, path: str) -> bool:
@@ -1,10 +1,21 @@
+import functools
 import tkinter as tk
+from datetime import datetime, timezone
 from tkinter import ttk, messagebox
 from ui.case_dialog import CaseDialog
-from logic.backend import get_initial_cases
+from logic.backend import search_cases
+from logic.backend import next_case_id
+from logic.backend import case_matches
+from logic.backend import case_changes
 from logic.backend import add_case
 from logic.backend import update_case
 from logic.backend import delete_case
+from logic.inference_executor import InferenceExecutor
+
+PAGE_SIZE = 100  # rows fetched per request; more are loaded as the table scrolls
+SORT_COLUMNS = {"id": "case_id", "patient": "patient_name", "date": "date", "status": "segmentation_status"}
+SEARCH_DEBOUNCE_MS = 150  # wait for typing to pause before querying
+SYNC_INTERVAL_MS = 15000  # how often to pick up changes made on other workstations
 
 
 class CasesFrame(tk.Frame):
@@ -12,6 +23,16 @@ class CasesFrame(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
+        self.db = getattr(controller, "db", None)  # None -> backend's shared handle
+        self._sort = "id"
+        self._descending = False
+        self._cursor = None  # next-page cursor from search_cases; None once everything is loaded
+        self._synced_at = None  # watermark for case_changes
+        self._search_after = None  # pending debounced reload
+        self._rows = {}  # iid (case_id) -> (values, zebra tag) currently shown in the tree
+        self._uploader = InferenceExecutor(max_workers=1)  # new cases upload off the Tk thread
+        self._upload_job = None
+        self._syncer = InferenceExecutor(max_workers=1)  # change polling, so a slow server never stalls the UI
 
         # ---------- Styles (match login palette) ----------
         style = ttk.Style(self)
@@ -91,8 +112,7 @@ class CasesFrame(tk.Frame):
         self.search_entry = ttk.Entry(left, textvariable=self.search_var, width=28)
         self.search_entry.pack(side="left", fill="x", expand=True)
         ttk.Button(left, text="Clear", style="Ghost.TButton",
-                   command=lambda: (self.search_var.set(""),
-        self.refresh_table())).pack(side="left", padx=(8, 0))
+                   command=lambda: self.search_var.set("")).pack(side="left", padx=(8, 0))
 
         right = ttk.Frame(controls, style="Toolbar.TFrame")
         right.pack(side="right")
@@ -111,8 +131,12 @@ class CasesFrame(tk.Frame):
         self.tree = ttk.Treeview(card, columns=columns, show="headings", selectmode="browse")
         headers = {"id": "ID", "patient": "Patient", "date": "Date", "status": "Status", "images": "#Images"}
         widths = {"id": 120, "patient": 260, "date": 130, "status": 140, "images": 90}
+        self._headers = headers
         for col in columns:
-            self.tree.heading(col, text=headers[col])
+            if col in SORT_COLUMNS:
+                self.tree.heading(col, text=headers[col], command=lambda c=col: self.sort_by(c))
+            else:
+                self.tree.heading(col, text=headers[col])
             self.tree.column(col, stretch=True, width=widths[col])
 
         # zebra rows
@@ -121,20 +145,29 @@ class CasesFrame(tk.Frame):
 
         # scrollbars
         yscroll = ttk.Scrollbar(card, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=yscroll.set)
+        self._yscroll = yscroll
+        self.tree.configure(yscrollcommand=self._on_yscroll)
         self.tree.pack(side="left", fill="both", expand=True)
         yscroll.pack(side="right", fill="y")
 
+        footer = ttk.Frame(root, style="Toolbar.TFrame", padding=(16, 0, 16, 8))
+        footer.pack(fill="x")
+        self.count_label = ttk.Label(footer, text="", style="Muted.TLabel")
+        self.count_label.pack(side="left")
+        self.upload_label = ttk.Label(footer, text="", style="Muted.TLabel")
+        self.upload_label.pack(side="right")
+
         # bindings
-        self.search_var.trace_add("write", lambda *_: self.refresh_table())
+        self.search_var.trace_add("write", lambda *_: self._schedule_search())
         self.tree.bind("<Double-1>", lambda e: self.open_viewer())
         self.tree.bind("<Return>",   lambda e: self.open_viewer())
         self.tree.bind("<Delete>",   lambda e: self.delete_case())
         self.bind_all("<Control-n>", lambda e: self.add_case())
         self.bind_all("<Control-e>", lambda e: self.edit_case())
 
-        # Initial populate
-        self.on_show()
+        # Cases are loaded by on_show when the frame is first raised (after login),
+        # so building the UI never waits on MongoDB
+        self.after(SYNC_INTERVAL_MS, self._sync)
     # ---------- lifecycle ----------
     def on_show(self):
         self.role_label.config(text=f"Role: {self.controller.current_user_role}")
@@ -142,70 +175,270 @@ class CasesFrame(tk.Frame):
         if not hasattr(self.controller, "cases") or self.controller.cases is None:
             self.controller.cases = []
         if not self.controller.cases:
-            try:
-                self.controller.cases = get_initial_cases()
-            except Exception as e:
-                messagebox.showerror("Database error", f"Could not load cases from MongoDB:\n{e}")
-                self.controller.cases = []
-        self.refresh_table()
+            self._reload_when_connected()
+        else:
+            self.refresh_table()
         self.search_entry.focus_set()
 
+    def _reload_when_connected(self):
+        # the App connects on a background thread; wait for it rather than connecting here
+        error = getattr(self.controller, "db_error", None)
+        if error is not None:
+            messagebox.showerror("Database error", f"Could not load cases from MongoDB:\n{error}")
+        elif self.db is None or self.db.connected:
+            self.reload()
+        else:
+            self.count_label.config(text="Connecting to MongoDB…")
+            self.after(100, self._reload_when_connected)
+
+    # ---------- paging ----------
+    def reload(self):
+        """Fetch the first page for the current search and sort, replacing the table."""
+        self._synced_at = datetime.now(timezone.utc)
+        try:
+            cases, self._cursor = search_cases(
+                self.search_var.get(), sort=SORT_COLUMNS[self._sort],
+                descending=self._descending, page_size=PAGE_SIZE, db=self.db,
+            )
+        except Exception as e:
+            messagebox.showerror("Database error", f"Could not load cases from MongoDB:\n{e}")
+            cases, self._cursor = [], None
+        self.controller.cases = cases
+        self.refresh_table()
+        self.tree.yview_moveto(0)
+
+    def _schedule_search(self):
+        if self._search_after is not None:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(SEARCH_DEBOUNCE_MS, self._run_search)
+
+    def _run_search(self):
+        self._search_after = None
+        self.reload()
+
+    def load_more(self):
+        """Append the next page, if there is one."""
+        if self._cursor is None:
+            return
+        cursor, self._cursor = self._cursor, None  # guard against re-entry while fetching
+        try:
+            cases, self._cursor = search_cases(
+                self.search_var.get(), sort=SORT_COLUMNS[self._sort],
+                descending=self._descending, page_size=PAGE_SIZE, after=cursor, db=self.db,
+            )
+        except Exception as e:
+            self._cursor = cursor
+            messagebox.showerror("Database error", f"Could not load more cases:\n{e}")
+            return
+        self.controller.cases.extend(cases)
+        self.refresh_table()
+
+    def sort_by(self, col):
+        if self._sort == col:
+            self._descending = not self._descending
+        else:
+            self._sort, self._descending = col, False
+        for c, text in self._headers.items():
+            arrow = (" ▼" if self._descending else " ▲") if c == self._sort else ""
+            self.tree.heading(c, text=text + arrow)
+        self.reload()
+
+    def _on_yscroll(self, first, last):
+        self._yscroll.set(first, last)
+        # infinite scroll: fetch the next page once the bottom rows come into view
+        if self._cursor is not None and float(last) >= 0.95:
+            self.after_idle(self.load_more)
+
+    # ---------- local patching ----------
+    def _index_of(self, case_id):
+        for i, c in enumerate(self.controller.cases):
+            if c.case_id == case_id:
+                return i
+        return None
+
+    def _place_case(self, case):
+        """
+        Put an authoritative copy of `case` where the current search and sort
+        would list it (or drop it if it no longer matches). Returns True if
+        the loaded rows changed.
+        """
+        cases = self.controller.cases
+        i = self._index_of(case.case_id)
+        if i is not None and cases[i] == case:
+            return False
+        if i is not None:
+            del cases[i]
+        if not case_matches(case, self.search_var.get()):
+            return i is not None
+
+        field = SORT_COLUMNS[self._sort]
+        key = (getattr(case, field), case.case_id)
+        pos = len(cases)
+        for j, other in enumerate(cases):
+            other_key = (getattr(other, field), other.case_id)
+            if (key > other_key) if self._descending else (key < other_key):
+                pos = j
+                break
+        if pos == len(cases) and self._cursor is not None:
+            return i is not None  # sorts past the loaded rows; it arrives with a later page
+        cases.insert(pos, case)
+        return True
+
+    def _drop_case(self, case_id):
+        i = self._index_of(case_id)
+        if i is None:
+            return False
+        del self.controller.cases[i]
+        return True
+
+    def _sync(self):
+        """Pick up changes other workstations made since the last sync (queried off the Tk thread)."""
+        if self._synced_at is None:
+            self.after(SYNC_INTERVAL_MS, self._sync)
+            return
+        job = self._syncer.submit(functools.partial(case_changes, db=self.db), self._synced_at,
+                                  key=self._synced_at)
+        self.after(100, self._poll_sync, job)
+
+    def _poll_sync(self, job):
+        if not job.done():
+            self.after(100, self._poll_sync, job)
+            return
+        outcome = job.outcome()
+        if outcome["status"] == "ok":
+            changed, deleted, watermark = outcome["result"]
+            if self._synced_at == job.key:  # a reload meanwhile set its own watermark
+                self._synced_at = watermark
+            dirty = False
+            for case in changed:
+                dirty |= self._place_case(case)
+            for case_id in deleted:
+                dirty |= self._drop_case(case_id)
+            if dirty:
+                self.refresh_table()
+        elif outcome["status"] == "error":
+            print(f"[CasesFrame] Sync failed: {outcome['error']}")
+        self.after(SYNC_INTERVAL_MS, self._sync)
+
+    def _update_count(self):
+        n = len(self.controller.cases)
+        more = " — scroll for more" if self._cursor is not None else ""
+        self.count_label.config(text=f"{n} case{'s' if n != 1 else ''} shown{more}")
+
     # ---------- helpers ----------
     def _existing_ids(self):
         return {c.case_id for c in self.controller.cases}
 
     def _next_id(self):
-        maxnum = 0
-        for c in self.controller.cases:
-            try:
-                n = int(str(c.case_id).split("-")[-1])
-                maxnum = max(maxnum, n)
-            except Exception:
-                pass
-        return f"LC-{maxnum+1:03d}"
-
-    def get_filtered_cases(self):
-        q = self.search_var.get().lower().strip()
-        if not q:
-            return self.controller.cases
-        return [c for c in self.controller.cases
-                if q in c.case_id.lower() or q in c.patient_name.lower()]
+        # the highest id may not be on a loaded page, so ask the database
+        try:
+            return next_case_id(db=self.db)
+        except Exception:
+            return ""
 
     def refresh_table(self):
-        # clear
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        # fill with zebra striping
-        for i, case in enumerate(self.get_filtered_cases()):
+        """
+        Bring the tree in line with controller.cases, touching only rows that
+        were added, removed, moved or edited. Rows are keyed by case_id.
+        """
+        desired = []
+        seen = set()
+        for case in self.controller.cases:
+            if case.case_id not in seen:  # legacy duplicate ids would clash as iids
+                seen.add(case.case_id)
+                desired.append(case)
+
+        stale = [iid for iid in self._rows if iid not in seen]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self._rows[iid]
+
+        current = list(self.tree.get_children())
+        p = 0  # walks `current`; rows moved out of order are skipped when reached
+        moved = set()
+        for i, case in enumerate(desired):
+            iid = case.case_id
+            while p < len(current) and current[p] in moved:
+                p += 1
+            values = (case.case_id, case.patient_name, case.date, case.segmentation_status, len(case.ct_images))
             tag = "evenrow" if i % 2 == 0 else "oddrow"
-            self.tree.insert(
-                "", "end",
-                values=(case.case_id, case.patient_name, case.date, case.segmentation_status, len(case.ct_images)),
-                tags=(tag,)
-            )
+            row = self._rows.get(iid)
+            if row is None:
+                self.tree.insert("", i, iid=iid, values=values, tags=(tag,))
+            else:
+                if p < len(current) and current[p] == iid:
+                    p += 1
+                else:
+                    self.tree.move(iid, "", i)
+                    moved.add(iid)
+                if row[0] != values:
+                    self.tree.item(iid, values=values)
+                if row[1] != tag:
+                    self.tree.item(iid, tags=(tag,))
+            self._rows[iid] = (values, tag)
+        self._update_count()
 
     # ---------- actions ----------
     def add_case(self):
+        if self._busy():
+            return  # Ctrl-N still fires while the Add button is disabled
         new_id = self._next_id()
         dlg = CaseDialog(self, title="Add Case", default_id=new_id, existing_ids=self._existing_ids())
         self.wait_window(dlg)
         if dlg.result:
-            add_case(dlg.result)
-            self.controller.cases = get_initial_cases()
-            self.refresh_table()
+            self._start_job(add_case, dlg.result, dlg.result.case_id, "Saving", "save", self._on_added)
+
+    def _on_added(self, job, stored):
+        if stored is None:
+            messagebox.showerror("Duplicate case", f"Case {job.key} already exists.")
+            return
+        self._place_case(stored)
+        self.refresh_table()
+
+    def _busy(self):
+        return self._upload_job is not None and not self._upload_job.done()
+
+    def _start_job(self, fn, payload, key, verb, action, on_ok):
+        """
+        Run a case write (which may upload images) off the Tk thread; `on_ok(job, result)` runs
+        back on it when the write succeeds, failures are shown in a message box.
+        """
+        for b in (self.btn_add, self.btn_edit, self.btn_del):
+            b.state(["disabled"])
+        self.upload_label.config(text=f"{verb} {key}…")
+        self._upload_job = self._uploader.submit(functools.partial(fn, db=self.db), payload, key=key)
+        self.after(100, self._poll_upload, self._upload_job, action, on_ok)
+
+    def _poll_upload(self, job, action, on_ok):
+        done, total, message = job.progress
+        if total:
+            self.upload_label.config(text=f"{job.key}: {message} ({100 * done // total}%)")
+        if not job.done():
+            self.after(100, self._poll_upload, job, action, on_ok)
+            return
+
+        self._upload_job = None
+        for b in (self.btn_add, self.btn_edit, self.btn_del):
+            b.state(["!disabled"])
+        self.upload_label.config(text="")
+        outcome = job.outcome()
+        if outcome["status"] == "error":
+            messagebox.showerror("Database error", f"Could not {action} case {job.key}:\n\n{outcome['error']}")
+        elif outcome["status"] == "ok":
+            on_ok(job, outcome["result"])
 
     def _get_selected_case(self):
         sel = self.tree.selection()
         if not sel:
             messagebox.showwarning("Warning", "Select a case first")
             return None
-        case_id = self.tree.item(sel[0], "values")[0]
-        for c in self.controller.cases:
-            if c.case_id == case_id:
-                return c
-        return None
+        i = self._index_of(sel[0])  # iids are case_ids
+        return self.controller.cases[i] if i is not None else None
 
     def edit_case(self):
+        if self._busy():
+            return
         case = self._get_selected_case()
         if not case:
             return
@@ -213,23 +446,26 @@ class CasesFrame(tk.Frame):
         dlg = CaseDialog(self, title="Edit Case", case=case, existing_ids=ids)
         self.wait_window(dlg)
         if dlg.result:
-            case.case_id = dlg.result.case_id
-            case.patient_name = dlg.result.patient_name
-            case.date = dlg.result.date
-            case.segmentation_status = dlg.result.segmentation_status
-            case.ct_images = dlg.result.ct_images
-            update_case(case)
-            self.controller.cases = get_initial_cases()
-            self.refresh_table()
+            self._start_job(update_case, dlg.result, case.case_id, "Updating", "update", self._on_updated)
+
+    def _on_updated(self, job, stored):
+        # the loaded row is replaced by what the database stored, not mutated
+        self._place_case(stored)
+        self.refresh_table()
 
     def delete_case(self):
+        if self._busy():
+            return
         case = self._get_selected_case()
         if not case:
             return
         if messagebox.askyesno("Confirm delete",
                                f"Delete case {case.case_id} - {case.patient_name}?"):
-            self.controller.cases.remove(case)
-            delete_case(case.case_id)
+            self._start_job(delete_case, case.case_id, case.case_id, "Deleting", "delete", self._on_deleted)
+
+    def _on_deleted(self, job, _deleted):
+        # False means another workstation deleted it first; either way it is gone
+        if self._drop_case(job.key):
             self.refresh_table()
 
     def open_viewer(self):
@@ -1,35 +1,60 @@
 import os
+import functools
 import tkinter as tk
+from collections import OrderedDict
+import numpy as np
 from tkinter import ttk, messagebox
 from PIL import Image, ImageTk, ImageOps
 
 # your existing mock; works unchanged
-from logic.backend import run_ai
+from logic.backend import run_ai, open_case_frames
+from logic.inference_executor import InferenceExecutor
+from logic.pyramid import nearest_level
 # Replace Case import with the correct path
 from model.models import Case
 
+RENDER_CACHE_SIZE = 96    # resampled PhotoImages kept across scrolls / zoom steps
+PREFETCH_SCREENS = 1.0    # also render frames within this many canvas heights of the view
+FRAME_POLL_MS = 50        # how often decoded frames are picked up while some are pending
+HEATMAP_CACHE_SIZE = 8    # colorized heatmaps kept, one per distinct source size
+SLIDER_REDRAW_MS = 30     # opacity drags redraw at most this often, with the latest value
+
+
 class ViewerFrame(tk.Frame):
     """
     Stacked (concatenated) viewer with direct DICOM support:
       • Accepts PNG/JPG and DICOM paths in case.series_paths
-      • DICOM is decoded on the fly (all frames shown)
+      • DICOM is decoded on the fly (all frames shown); headers are read first and
+        frames are decoded in the background as they approach the view
+      • Zoomed-out views are resampled from the nearest precomputed pyramid level
       • Prev/Next navigation + stacked scrolling, heatmap, zoom, fit width / 1:1
     """
     def __init__(self, parent, controller):
         super().__init__(parent)
         self.controller = controller
+        self.db = getattr(controller, "db", None)  # None -> backend's shared handle
 
         # --- state ---
-        self._pil_images = []                 # list[PIL.Image] for all frames (RGBA)
-        self._file_first_index = []           # list[int] listbox idx -> first frame index in _pil_images
-        self._display_imgs = []               # list[ImageTk.PhotoImage]
+        self._provider = None                 # FrameProvider for the current case (decodes on demand)
+        self._frame_poll = None               # pending after() that picks up decoded frames
+        self._file_first_index = []           # list[int] listbox idx -> first frame index in the provider
+        self._render_cache = OrderedDict()    # (frame, w, h, overlay) -> (opacity, ImageTk.PhotoImage), LRU
+        self._shown = []                      # PhotoImages on the canvas right now (keeps them alive)
+        self._overlay_gen = 0                 # bumped whenever the heatmap source changes
+        self._heatmap_layers = OrderedDict()  # (w, h) -> (colorized RGB, alpha) arrays, LRU
+        self._redraw_after = None             # pending coalesced redraw
         self._display_sizes = []              # list[(w, h)]
         self._display_offsets = []            # list[int] top Y of each frame in stacked display
         self._total_height = 0
         self._scroll_y = 0
         self._heatmap_src = None
         self._zoom = 1.0
+        self._scale = 1.0                     # effective display scale of the current layout
         self._fit_mode = True
+        self._executor = InferenceExecutor()
+        self._job = None                      # running InferenceJob, if any
+        self._loader = InferenceExecutor()    # image downloads, separate from inference
+        self._load_job = None
 
         # --- styles (match your app) ---
         style = ttk.Style(self)
@@ -98,8 +123,16 @@ class ViewerFrame(tk.Frame):
         ttk.Label(hm_controls, text="Opacity", style="Card.TLabel").pack(anchor="w", pady=(6, 0))
         self.hm_opacity = tk.DoubleVar(value=0.55)
         ttk.Scale(hm_controls, from_=0.0, to=1.0, orient="horizontal",
-                  variable=self.hm_opacity, command=lambda _=None: self._rebuild_and_redraw()).pack(fill="x")
-        ttk.Button(right, text="Run AI", style="Accent.TButton", command=self.run_ai).pack(fill="x", pady=(8, 8))
+                  variable=self.hm_opacity, command=lambda _=None: self._schedule_redraw()).pack(fill="x")
+        self.run_btn = ttk.Button(right, text="Run AI", style="Accent.TButton", command=self.run_ai)
+        self.run_btn.pack(fill="x", pady=(8, 4))
+        job_row = ttk.Frame(right, style="Card.TFrame"); job_row.pack(fill="x", pady=(0, 8))
+        self.job_bar = ttk.Progressbar(job_row, maximum=1.0, value=0.0, style="Blue.Horizontal.TProgressbar")
+        self.job_bar.pack(side="left", fill="x", expand=True)
+        self.cancel_btn = ttk.Button(job_row, text="Cancel", style="Ghost.TButton",
+                                     command=self._cancel_job, state="disabled")
+        self.cancel_btn.pack(side="left", padx=(6, 0))
+        self.job_label = ttk.Label(right, text="", style="Card.TLabel"); self.job_label.pack(anchor="w")
         ttk.Label(right, text="Explanation", style="Card.TLabel").pack(anchor="w")
         self.explanation_text = tk.Text(right, width=36, height=12, wrap="word",
                                         bg=FIELD_BG, fg="#e5e7eb", insertbackground="#e5e7eb", relief="flat")
@@ -117,190 +150,170 @@ class ViewerFrame(tk.Frame):
         self.bind_all("<Right>", lambda e: self.next_image())
 
         self._palette = self._build_palette()
+        self._lut = np.array(self._palette, dtype=np.uint8).reshape(256, 3)
 
     # ---------- lifecycle ----------
     def on_show(self):
         c = self.controller.current_case  # type: Case
         self.case_label.config(text=f"Case: {c.case_id}  ·  {c.patient_name}")
 
-        self._heatmap_src = None
+        self._cancel_job()
+        self._set_heatmap(None)
         self.explanation_text.delete("1.0", "end")
         for w in self.biomarker_frame.winfo_children(): w.destroy()
 
-        # load all paths (PNG/JPG or DICOM) into frames
-        self._pil_images.clear()
+        # drop the previous case's frames; the new ones are decoded as they are drawn
+        self._close_provider()
+        self._render_cache.clear()
         self._file_first_index.clear()
         self.series_list.delete(0, "end")
+        self._fit()
 
-        for i, path in enumerate(c.ct_images):  # Use ct_images instead of series_paths
+        # fetch from GridFS and read headers off the Tk thread
+        self._cancel_load()
+        self._load_job = self._loader.submit(functools.partial(open_case_frames, db=self.db), c,
+                                             key=c.case_id)
+        self.job_label.config(text="Fetching images…")
+        self.after(50, self._poll_load, self._load_job)
+
+    def _cancel_load(self):
+        if self._load_job is not None and not self._load_job.done():
+            self._load_job.cancel()
+        self._load_job = None
+
+    def _close_provider(self, wait=False):
+        if self._frame_poll is not None:
             try:
-                frames = self._load_any_to_frames(path)  # list of PIL RGBA
-                first_idx = len(self._pil_images)
-                self._pil_images.extend(frames)
-                # label shows frame count for DICOM
-                label = os.path.basename(path)
-                if len(frames) > 1: label += f"  [{len(frames)}]"
-                self.series_list.insert("end", f"{i + 1}. {label}")
-                self._file_first_index.append(first_idx)
-            except Exception as e:
-                messagebox.showerror("Image error", f"Could not open:\n{path}\n\n{e}")
-
-        if self._pil_images:
+                self.after_cancel(self._frame_poll)
+            except tk.TclError:
+                pass  # interpreter already gone (closing via atexit)
+            self._frame_poll = None
+        if self._provider is not None:
+            self._provider.close(wait=wait)
+            self._provider = None
+
+    def shutdown(self):
+        """Stop background work and delete decoded frames; called when the app closes."""
+        self._cancel_load()
+        if self._job is not None and not self._job.done():
+            self._job.cancel()
+        self._loader.shutdown()
+        self._executor.shutdown()
+        self._close_provider(wait=True)
+
+    def _poll_load(self, job):
+        if job is not self._load_job:
+            if job.done() and job.outcome()["status"] == "ok":
+                job.outcome()["result"].close()
+            elif not job.done():
+                self.after(100, self._poll_load, job)  # close its provider once it lands
+            return  # case switched while downloading
+        done, total, message = job.progress
+        if total:
+            self.job_bar.configure(value=done / total)
+            self.job_label.config(text=message)
+        if not job.done():
+            self.after(100, self._poll_load, job)
+            return
+
+        self._load_job = None
+        self.job_bar.configure(value=0.0)
+        self.job_label.config(text="")
+        outcome = job.outcome()
+        if outcome["status"] == "error":
+            messagebox.showerror("Image error", f"Could not fetch images for case {job.key}:\n\n{outcome['error']}")
+        elif outcome["status"] == "ok":
+            self._show_provider(outcome["result"])
+
+    def _show_provider(self, provider):
+        self._provider = provider
+        c = self.controller.current_case
+        files = provider.files
+        names = list(c.image_names) if c is not None and len(c.image_names) == len(files) else []
+        for i, f in enumerate(files):
+            if f.error is not None:
+                messagebox.showerror("Image error", f"Could not open:\n{f.path}\n\n{f.error}")
+                continue
+            # label shows frame count for DICOM
+            label = names[i] if names else os.path.basename(f.path)
+            if f.frames > 1: label += f"  [{f.frames}]"
+            self.series_list.insert("end", f"{i + 1}. {label}")
+            self._file_first_index.append(provider.first_index[i])
+
+        if len(provider):
             self.series_list.selection_clear(0, "end");
             self.series_list.selection_set(0)
         self._fit()
         self._update_nav()
 
     # ---------- loading ----------
-    def _is_dicom(self, path):
-        try:
-            with open(path, "rb") as f:
-                f.seek(128)
-                if f.read(4) == b"DICM":
-                    return True
-        except Exception:
-            pass
-        # fallback: try reading header quickly
-        try:
-            from pydicom import dcmread
-            dcmread(path, stop_before_pixels=True, force=True)
-            return True
-        except Exception:
-            return False
-
-    def _load_any_to_frames(self, path):
-        """Return list[PIL.Image (RGBA)] for a PNG/JPG or DICOM file."""
-        ext = os.path.splitext(path)[1].lower()
-        if ext in (".png", ".jpg", ".jpeg"):
-            from PIL import Image
-            img = Image.open(path).convert("RGBA")
-            return [img]
-        if self._is_dicom(path):
-            return self._dicom_to_frames(path)
-        # unknown → let PIL try
-        from PIL import Image
-        img = Image.open(path).convert("RGBA")
-        return [img]
-
-    def _dicom_to_frames(self, path):
-        """Decode DICOM (supports multi-frame, VOI/MOD LUT, MONOCHROME1) -> list of PIL RGBA."""
-        import numpy as np
-        try:
-            from pydicom import dcmread
-            from pydicom.pixel_data_handlers.util import apply_modality_lut, apply_voi_lut
-        except Exception as e:
-            raise RuntimeError("DICOM support requires: pydicom, numpy, pillow") from e
-
-        ds = dcmread(path, force=True)
-        try:
-            arr = ds.pixel_array  # uses installed pixel handlers
-        except Exception as e:
-            raise RuntimeError(
-                "Cannot decode DICOM pixel data. Install plugins:\n"
-                "pip install pylibjpeg pylibjpeg-libjpeg pylibjpeg-openjpeg\n"
-                "or: pip install gdcm"
-            ) from e
-
-        # modality/voi LUTs
-        try: arr = apply_modality_lut(arr, ds)
-        except Exception: pass
-        try: arr = apply_voi_lut(arr, ds)
-        except Exception: pass
+    def _frame_count(self):
+        return len(self._provider) if self._provider is not None else 0
 
-        # MONOCHROME1 inversion
-        try:
-            if str(getattr(ds, "PhotometricInterpretation", "")).upper() == "MONOCHROME1":
-                arr = arr.max() - arr
-        except Exception:
-            pass
-
-        def to_uint8(a):
-            a = a.astype("float32")
-            if a.size >= 16:
-                lo, hi = np.percentile(a, (1, 99))
-            else:
-                lo, hi = float(a.min()), float(a.max())
-            if hi <= lo:
-                lo, hi = float(a.min()), float(a.max())
-            if hi <= lo:
-                return (a * 0).astype("uint8")
-            a = np.clip(a, lo, hi)
-            a = (a - lo) / (hi - lo)
-            return (a * 255.0 + 0.5).astype("uint8")
-
-        imgs = []
-        from PIL import Image
-
-        # handle shapes
-        if arr.ndim == 2:
-            g = to_uint8(arr)
-            pil = Image.fromarray(g, mode="L").convert("RGBA")
-            imgs.append(pil)
-        elif arr.ndim == 3:
-            # grayscale multi-frame OR color single frame (rows, cols, 3)
-            if arr.shape[-1] in (3, 4):  # color
-                if arr.dtype != "uint8":
-                    arr = np.clip(arr, 0, 255).astype("uint8")
-                pil = Image.fromarray(arr[..., :3], mode="RGB").convert("RGBA")
-                imgs.append(pil)
-            else:
-                for i in range(arr.shape[0]):
-                    g = to_uint8(arr[i])
-                    pil = Image.fromarray(g, mode="L").convert("RGBA")
-                    imgs.append(pil)
-        elif arr.ndim == 4 and arr.shape[-1] in (3, 4):  # (frames, rows, cols, 3)
-            for i in range(arr.shape[0]):
-                frame = arr[i]
-                if frame.dtype != "uint8":
-                    frame = np.clip(frame, 0, 255).astype("uint8")
-                pil = Image.fromarray(frame[..., :3], mode="RGB").convert("RGBA")
-                imgs.append(pil)
-        else:
-            # fallback: first slice
-            g = to_uint8(arr if arr.ndim == 2 else arr[0])
-            pil = Image.fromarray(g, mode="L").convert("RGBA")
-            imgs.append(pil)
-
-        return imgs
+    def _poll_frames(self):
+        self._frame_poll = None
+        if self._provider is None:
+            return
+        ready = self._provider.take_ready()
+        if ready:
+            self._redraw_only()
+        elif self._provider.pending():
+            self._frame_poll = self.after(FRAME_POLL_MS, self._poll_frames)
 
     # ---------- heatmap ----------
-    def _apply_heatmap(self, base):
-        if not (self._heatmap_src and self.heatmap_on.get()):
-            return base
-        hm = self._heatmap_src.resize(base.size, Image.LANCZOS)
+    def _heatmap_layer(self, size):
+        """Colorized heatmap and its autocontrasted alpha at `size`, computed once per source."""
+        layer = self._heatmap_layers.get(size)
+        if layer is not None:
+            self._heatmap_layers.move_to_end(size)
+            return layer
+        hm = self._heatmap_src.resize(size, Image.LANCZOS)
         if hm.mode != "RGBA": hm = hm.convert("RGBA")
-        alpha = hm.split()[3]
-        alpha = ImageOps.autocontrast(alpha, cutoff=2)
-        colored = self._colorize_from_luminance(alpha)
+        alpha = np.asarray(ImageOps.autocontrast(hm.split()[3], cutoff=2))
+        layer = (self._lut[alpha], alpha)
+        self._heatmap_layers[size] = layer
+        while len(self._heatmap_layers) > HEATMAP_CACHE_SIZE:
+            self._heatmap_layers.popitem(last=False)
+        return layer
+
+    def _compose(self, src):
+        """PIL image of a display frame (uint8 gray or RGB array) with the heatmap blended in."""
+        if not (self._heatmap_src and self.heatmap_on.get()):
+            return Image.fromarray(src)
+        h, w = src.shape[:2]
+        colored, alpha = self._heatmap_layer((w, h))
         op = max(0.0, min(float(self.hm_opacity.get()), 1.0))
-        a_scaled = alpha.point(lambda p: int(p * op))
-        colored.putalpha(a_scaled)
-        return Image.alpha_composite(base, colored)
+        a = (np.arange(256, dtype=np.uint16) * op).astype(np.uint16)[alpha][..., None]
+        base = src[..., None] if src.ndim == 2 else src
+        out = (colored * a + base * (255 - a) + 127) // 255
+        return Image.fromarray(out.astype(np.uint8))
 
     # ---------- build + render ----------
     def _rebuild_and_redraw(self):
+        """Lay the stack out for the current zoom and draw what is in view."""
         cw = max(self.canvas.winfo_width(), 1)
         ch = max(self.canvas.winfo_height(), 1)
-        if cw <= 1 or not self._pil_images:
+        if cw <= 1 or not self._frame_count():
+            self._display_sizes.clear(); self._display_offsets.clear()
+            self._shown.clear()
             self.canvas.delete("all")
             self.canvas.create_text(cw // 2, ch // 2, text="[CT slice placeholder]", fill="white")
             self._update_nav()
             return
 
-        widest = max(img.width for img in self._pil_images)
+        shapes = [self._provider.shape(i) for i in range(self._frame_count())]
+        widest = max(cols for _rows, cols in shapes)
         base_scale = cw / widest if self._fit_mode else 1.0
         scale = max(0.05, min(base_scale * self._zoom, 8.0))
+        self._scale = scale
         self.zoom_label.configure(text=f"{int(round(scale*100))}%")
 
+        # placement depends only on frame sizes; pixels are produced lazily in _redraw_only
         padding = 8
-        self._display_imgs.clear(); self._display_sizes.clear(); self._display_offsets.clear()
+        self._display_sizes.clear(); self._display_offsets.clear()
         y = 0
-        for img in self._pil_images:
-            composed = self._apply_heatmap(img.copy())
-            w = max(1, int(img.width * scale)); h = max(1, int(img.height * scale))
-            disp = composed.resize((w, h), Image.LANCZOS)
-            tkimg = ImageTk.PhotoImage(disp)
-            self._display_imgs.append(tkimg)
+        for rows, cols in shapes:
+            w = max(1, int(cols * scale)); h = max(1, int(rows * scale))
             self._display_sizes.append((w, h))
             self._display_offsets.append(y)
             y += h + padding
@@ -310,18 +323,87 @@ class ViewerFrame(tk.Frame):
         self._redraw_only()
         self._update_nav()
 
+    def _overlay_key(self):
+        if not (self._heatmap_src and self.heatmap_on.get()):
+            return None
+        return self._overlay_gen
+
+    def _rendered(self, i, overlay):
+        """PhotoImage of frame i at its laid-out size, from the LRU when possible; None until decoded."""
+        w, h = self._display_sizes[i]
+        key = (i, w, h, overlay)
+        # opacity is not part of the key: a render at another opacity is replaced in place,
+        # so dragging the slider keeps one entry per frame instead of flooding the LRU
+        opacity = None if overlay is None else round(float(self.hm_opacity.get()), 3)
+        cached = self._render_cache.get(key)
+        if cached is not None and cached[0] == opacity:
+            self._render_cache.move_to_end(key)
+            return cached[1]
+        # the coarsest pyramid level that still covers the display scale
+        src = self._provider.get(i, nearest_level(self._scale))
+        if src is None:
+            return None
+        composed = self._compose(src)
+        disp = composed if composed.size == (w, h) else composed.resize((w, h), Image.LANCZOS)
+        tkimg = ImageTk.PhotoImage(disp)
+        self._render_cache[key] = (opacity, tkimg)
+        self._render_cache.move_to_end(key)
+        while len(self._render_cache) > RENDER_CACHE_SIZE:
+            self._render_cache.popitem(last=False)
+        return tkimg
+
+    def _schedule_redraw(self):
+        if self._redraw_after is None:
+            self._redraw_after = self.after(SLIDER_REDRAW_MS, self._coalesced_redraw)
+
+    def _coalesced_redraw(self):
+        self._redraw_after = None
+        self._redraw_only()
+
     def _redraw_only(self):
         self.canvas.delete("all")
         cw = max(self.canvas.winfo_width(), 1)
         ch = max(self.canvas.winfo_height(), 1)
-        if not self._display_imgs:
+        if not self._display_offsets:
+            self._shown.clear()
             self.canvas.create_text(cw // 2, ch // 2, text="[CT slice placeholder]", fill="white")
             return
         top = self._scroll_y; bottom = self._scroll_y + ch
-        for tkimg, (w, h), y in zip(self._display_imgs, self._display_sizes, self._display_offsets):
-            if y > bottom or (y + h) < top: continue
+        margin = int(ch * PREFETCH_SCREENS)
+        overlay = self._overlay_key()
+        near = list(self._frames_between(top - margin, bottom + margin))
+        self._provider.request(near, nearest_level(self._scale))
+        shown = []
+        for i in near:
+            tkimg = self._rendered(i, overlay)
+            y = self._display_offsets[i]; w, h = self._display_sizes[i]
+            if y > bottom or (y + h) < top: continue  # prefetched only
             x = (cw - w) // 2
+            if tkimg is None:
+                self.canvas.create_rectangle(x, y - self._scroll_y, x + w, y - self._scroll_y + h,
+                                             outline="#1f2937", fill="#0f172a")
+                text = "[could not decode]" if i in self._provider.errors else "Loading…"
+                self.canvas.create_text(x + w // 2, y - self._scroll_y + h // 2, text=text, fill="#94a3b8")
+                continue
+            shown.append(tkimg)
             self.canvas.create_image(x, y - self._scroll_y, anchor="nw", image=tkimg)
+        self._shown = shown
+        if self._frame_poll is None and self._provider.pending():
+            self._frame_poll = self.after(FRAME_POLL_MS, self._poll_frames)
+
+    def _frames_between(self, top, bottom):
+        """Indices of frames intersecting [top, bottom] in stack coordinates."""
+        offsets = self._display_offsets
+        lo, hi = 0, len(offsets)
+        while lo < hi:  # first frame whose top is below `top`
+            mid = (lo + hi) // 2
+            if offsets[mid] <= top: lo = mid + 1
+            else: hi = mid
+        i = max(0, lo - 1)
+        while i < len(offsets) and offsets[i] <= bottom:
+            if offsets[i] + self._display_sizes[i][1] >= top:
+                yield i
+            i += 1
 
     # ---------- navigation ----------
     def _current_index(self):
@@ -344,7 +426,7 @@ class ViewerFrame(tk.Frame):
         # also select the owning file in the left list
         file_idx = 0
         for i, first in enumerate(self._file_first_index):
-            last = self._file_first_index[i+1] - 1 if i+1 < len(self._file_first_index) else len(self._pil_images)-1
+            last = self._file_first_index[i+1] - 1 if i+1 < len(self._file_first_index) else self._frame_count()-1
             if first <= frame_idx <= last:
                 file_idx = i; break
         self.series_list.selection_clear(0, "end"); self.series_list.selection_set(file_idx)
@@ -394,7 +476,7 @@ class ViewerFrame(tk.Frame):
         self._scroll(delta * 120)
 
     def _scroll(self, pixels):
-        if not self._display_imgs: return
+        if not self._display_offsets: return
         ch = max(self.canvas.winfo_height(), 1)
         max_scroll = max(0, self._total_height - ch)
         self._scroll_y = max(0, min(self._scroll_y + pixels, max_scroll))
@@ -433,15 +515,55 @@ class ViewerFrame(tk.Frame):
             pal.extend([max(0,min(255,r)), max(0,min(255,g)), max(0,min(255,b))])
         return pal
 
-    def _colorize_from_luminance(self, lum_img):
-        p = lum_img.convert("P"); p.putpalette(self._palette)
-        return p.convert("RGBA")
-
     # ---------- actions ----------
     def run_ai(self):
         c = self.controller.current_case  # type: Case
-        result = run_ai(c)  # Replace mock_run_ai with run_ai
+        if self._job is not None and not self._job.done():
+            return
+        self._job = self._executor.submit(functools.partial(run_ai, db=self.db), c, key=c.case_id)
+        self.run_btn.config(state="disabled")
+        self.cancel_btn.config(state="normal")
+        self.job_bar.configure(value=0.0)
+        self.job_label.config(text="Queued…")
+        self.after(100, self._poll_job, self._job)
+
+    def _cancel_job(self):
+        if self._job is not None and not self._job.done():
+            self._job.cancel()
+            self.job_label.config(text="Cancelled")
+        self._job = None
+        self.run_btn.config(state="normal")
+        self.cancel_btn.config(state="disabled")
+        self.job_bar.configure(value=0.0)
+
+    def _poll_job(self, job):
+        if job is not self._job:
+            return  # superseded by a cancel or a case switch
+        done, total, message = job.progress
+        self.job_bar.configure(value=(done / total) if total else 0.0)
+        self.job_label.config(text=message)
+        if not job.done():
+            self.after(100, self._poll_job, job)
+            return
+
+        self._job = None
+        self.run_btn.config(state="normal")
+        self.cancel_btn.config(state="disabled")
+        outcome = job.outcome()
+        c = self.controller.current_case
+        if outcome["status"] == "cancelled" or c is None or c.case_id != job.key:
+            self.job_label.config(text="Cancelled")
+            return
+        if outcome["status"] == "error":
+            self.job_label.config(text="Failed")
+            messagebox.showerror("AI error", f"Could not run the model:\n{outcome['error']}")
+            return
+        self.job_bar.configure(value=1.0)
+        result = outcome["result"]
+        self.job_label.config(text="Loaded cached result" if result.get("cached") else "Done")
+        self._show_ai_result(result)
 
+    def _show_ai_result(self, result):
         # biomarkers
         for w in self.biomarker_frame.winfo_children():
             w.destroy()
@@ -456,5 +578,10 @@ class ViewerFrame(tk.Frame):
         self.explanation_text.delete("1.0", "end")
         self.explanation_text.insert("end", result.get("explanation", ""))
 
-        self._heatmap_src = result.get("heatmap")
-        self._rebuild_and_redraw()
\ No newline at end of file
+        self._set_heatmap(result.get("heatmap"))
+        self._rebuild_and_redraw()
+
+    def _set_heatmap(self, heatmap):
+        self._heatmap_src = heatmap
+        self._overlay_gen += 1
+        self._heatmap_layers.clear()